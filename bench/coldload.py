@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+# Compare serial and parallel cold loads of generated topology directories.
+# --delay adds a sleep to every file open to stand in for network storage.
+# Run from the top level directory: python -m bench.coldload --delay 2
+
+import argparse
+import copy
+import os
+import shutil
+import tempfile
+import time
+
+import mock.cache
+from bench.generate import generate
+from mock.cache import config_cache
+
+def slow_open(delay):
+    def opener(*args, **kwargs):
+        time.sleep(delay)
+        return open(*args, **kwargs)
+    return opener
+
+def cold_load(path, read_threads, parse_processes):
+    from config import DirectoryConfigs
+    config_cache.configure(read_threads=read_threads, parse_processes=parse_processes)
+    config_cache.clear()
+    start = time.time()
+    configs = DirectoryConfigs(path).configs
+    return time.time() - start, configs
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare serial and parallel cold loads of topology directories.')
+    parser.add_argument("-s", "--sizes", type=int, nargs='+', default=[100, 1000, 5000],
+                        help="number of routers (default: %(default)s)")
+    parser.add_argument("--threads", type=int, default=16, help="read threads for the parallel loads (default: %(default)s)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 2,
+                        help="parse processes for the parallel loads (default: %(default)s)")
+    parser.add_argument("--delay", type=float, default=0, help="milliseconds to sleep on every file open (default: %(default)s)")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="loads of each kind, the fastest is shown so starting the processes isn't counted (default: %(default)s)")
+    args = parser.parse_args()
+    # not imported at the top because the parse processes import this module
+    from config import Manager
+
+    if args.delay:
+        mock.cache.open = slow_open(args.delay / 1000.0)
+
+    variants = [("serial", 1, 0), ("threads", args.threads, 0), ("threads+procs", args.threads, args.processes)]
+    cwd = os.getcwd()
+    tmp = tempfile.mkdtemp()
+    try:
+        os.chdir(tmp)
+        print ("%8s " % "routers" + " ".join("%14s" % name for name, t, p in variants) + " %8s" % "speedup")
+        for size in args.sizes:
+            topology = "core-edge-%d" % size
+            os.makedirs("topologies/" + topology)
+            request = generate("core-edge", size, 1, 2, 1)
+            request["topology"] = topology
+            Manager(topology, False).PUBLISH(copy.deepcopy(request))
+
+            times = []
+            expected = None
+            for name, threads, processes in variants:
+                best = None
+                for i in range(args.repeat):
+                    elapsed, configs = cold_load("topologies/%s/" % topology, threads, processes)
+                    best = elapsed if best is None else min(best, elapsed)
+                if expected is None:
+                    expected = configs
+                elif list(configs.items()) != list(expected.items()):
+                    raise Exception("%s load of %s differs from the serial load" % (name, topology))
+                times.append(best)
+            print ("%8d " % size + " ".join("%12.1fms" % (t * 1000) for t in times) + " %7.1fx" % (times[0] / min(times[1:])))
+            shutil.rmtree("topologies/" + topology)
+    finally:
+        config_cache.configure(read_threads=1, parse_processes=0)
+        os.chdir(cwd)
+        shutil.rmtree(tmp)
+
+if __name__ == '__main__':
+    main()
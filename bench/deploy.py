@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+# Deploy a generated topology with a stub ansible-playbook, with different numbers of
+# playbooks at once and hosts per playbook, and check that a second deployment can't
+# start while one is running, that hosts that are up to date are skipped and that a
+# failed host is deployed again. Exits with 1 if a check fails.
+# --delay is how long the stub takes for each host.
+# Run from the top level directory: python -m bench.deploy --delay 0.5
+
+import argparse
+import copy
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from bench.generate import generate
+from config import Manager
+
+def deploy(manager, request):
+    """Run DEPLOY and wait for it. Returns (what DEPLOY returned, final state, seconds)"""
+    start = time.time()
+    started = manager.operation("DEPLOY", copy.deepcopy(request))
+    while manager.state == "DEPLOYING":
+        time.sleep(0.01)
+    return started, manager.state, time.time() - start
+
+def recorded(path):
+    # the hosts of every inventory the stub was given since the last call, with the routers
+    # deployed to them and the routers retired from them
+    hosts = {}
+    if os.path.exists(path):
+        with open(path) as fin:
+            for line in fin:
+                for group in json.loads(line).values():
+                    for host, h in group['hosts'].items():
+                        hosts[host] = (sorted(h['nodes']), sorted(h.get('retired', [])))
+        os.remove(path)
+    return hosts
+
+def main():
+    parser = argparse.ArgumentParser(description='Deploy a generated topology with a stub ansible-playbook.')
+    parser.add_argument("-r", "--routers", type=int, default=40, help="number of routers (default: %(default)s)")
+    parser.add_argument("--hosts", type=int, default=8, help="hosts to spread them over (default: %(default)s)")
+    parser.add_argument("--parallel", type=int, nargs='+', default=[1, 4], help="playbooks run at once (default: %(default)s)")
+    parser.add_argument("--batch", type=int, nargs='+', default=[1, 4], help="hosts per playbook (default: %(default)s)")
+    parser.add_argument("--delay", type=float, default=0.2, help="seconds the stub takes for each host (default: %(default)s)")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    tmp = tempfile.mkdtemp()
+    record = os.path.join(tmp, "inventories.json")
+    stub = [sys.executable, os.path.join(cwd, "bench", "stubplaybook.py"), "--delay", str(args.delay), "--record", record]
+    request = generate("core-edge", args.routers, 1, 0, 0, hosts=args.hosts)
+    request["topology"] = "deploy"
+    hosts = sorted(set(n["host"] for n in request["nodes"]))
+    failures = []
+    def check(what, ok):
+        print ("%-56s %s" % (what, "ok" if ok else "FAILED"))
+        if not ok:
+            failures.append(what)
+
+    try:
+        os.chdir(tmp)
+        os.makedirs("topologies/deploy")
+        os.makedirs("deployments")
+        print ("%8s %8s %8s %10s" % ("hosts", "parallel", "batch", "elapsed"))
+        for parallel in args.parallel:
+            for batch in args.batch:
+                manager = Manager(None, False, parallel, batch, deploy_command=stub)
+                started, state, elapsed = deploy(manager, dict(request, force=True))
+                print ("%8d %8d %8d %9.2fs %s" % (len(hosts), parallel, batch, elapsed, "" if state == "DONE" else state))
+        recorded(record)
+
+        manager = Manager(None, False, max(args.parallel), 1, deploy_command=stub)
+        manager.operation("DEPLOY", dict(copy.deepcopy(request), force=True))
+        check("a second DEPLOY is refused while one runs",
+              manager.operation("DEPLOY", copy.deepcopy(request)) == "deployment already in progress")
+        while manager.state == "DEPLOYING":
+            time.sleep(0.01)
+        check("every host is deployed", sorted(recorded(record)) == hosts and manager.state == "DONE")
+
+        started, state, elapsed = deploy(manager, request)
+        status = manager.deployer.status()
+        check("hosts that are up to date are skipped",
+              not recorded(record) and all(status[h]['state'] == "UNCHANGED" for h in hosts))
+
+        changed = copy.deepcopy(request)
+        node = next(n for n in changed["nodes"] if n["cls"] == "router")
+        node["workerThreads"] = 7
+        deploy(manager, changed)
+        check("only the router that changed is deployed", recorded(record) == {node["host"]: ([node["name"]], [])})
+
+        moved = sorted(n["name"] for n in changed["nodes"] if n["cls"] == "router" and n["host"] == hosts[-1])
+        for n in changed["nodes"]:
+            if n["cls"] == "router" and n["host"] == hosts[-1]:
+                n["host"] = hosts[0]
+        deploy(manager, changed)
+        deployed = recorded(record)
+        check("routers are stopped on a host that has none left",
+              deployed.get(hosts[-1]) == ([], moved) and set(moved) <= set(deployed.get(hosts[0], ([], []))[0]))
+        deploy(manager, changed)
+        check("a host that has no routers left isn't deployed again", not recorded(record))
+
+        failing = Manager(None, False, max(args.parallel), 1, deploy_command=stub + ["--fail", hosts[0]])
+        for n in changed["nodes"]:
+            if n["cls"] == "router":
+                n["workerThreads"] = 9
+        started, state, elapsed = deploy(failing, changed)
+        recorded(record)
+        check("a failed host fails the deployment", state == 2 and failing.deployer.status()[hosts[0]]['state'] == "FAILED")
+        deploy(manager, changed)
+        check("a failed host is deployed again", sorted(recorded(record)) == [hosts[0]])
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp)
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
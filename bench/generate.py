@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+# Generate synthetic topologies in the form the console sends them to the server,
+# and optionally PUBLISH them to topologies/<name>/. Keep generated topologies out of
+# the tree by publishing them somewhere else:
+# Run from the top level directory: python -m bench.generate core-edge 100 big-100 --topologies /tmp/topologies
+
+import argparse
+import random
+
+shapes = ("mesh", "hub", "core-edge")
+
+def generate(shape, routers, listeners=1, addresses=2, ssl_profiles=0, hosts=10, core=None, seed=0):
+    """Return a PUBLISH request for a topology of the given shape
+
+    mesh:      every router is linked to every other router
+    hub:       router 0 is linked to every other router
+    core-edge: a fully meshed interior core (sqrt(routers) by default) with
+               the remaining routers attached as edge routers, spread over the core
+    """
+    rand = random.Random(seed)
+    if shape == "core-edge":
+        core = core or max(1, min(routers, int(routers ** 0.5)))
+    elif shape == "hub":
+        core = 1
+    else:
+        core = routers
+
+    nodes = []
+    for i in range(routers):
+        name = "R%d" % i
+        node = {"key": "amqp:/_topo/0/" + name + "/$management",
+                "name": name,
+                "routerId": name,
+                "id": i,
+                "index": i,
+                "cls": "router",
+                "nodeType": "inter-router" if i < core or shape != "core-edge" else "edge",
+                "host": "10.0.%d.%d" % (i % hosts // 250, i % hosts % 250 + 1),
+                "x": rand.random() * 1000,
+                "y": rand.random() * 1000,
+                "listeners": {},
+                "addresss": {},
+                "sslProfiles": {}}
+        for l in range(listeners):
+            # unique like the console makes them, so routers that share a host can all start
+            port = str(22001 + i * listeners + l)
+            node["listeners"][port] = {"port": port, "host": "0.0.0.0", "role": "normal",
+                                       "saslMechanisms": "ANONYMOUS", "authenticatePeer": False}
+        for a in range(addresses):
+            prefix = "%s/%s/%d" % (rand.choice(("closest", "multicast", "balanced")), name, a)
+            node["addresss"][prefix] = {"prefix": prefix, "distribution": prefix.split('/')[0]}
+        for s in range(ssl_profiles):
+            profile = "%s-ssl-%d" % (name, s)
+            node["sslProfiles"][profile] = {"name": profile, "certFile": "/etc/pki/%s.pem" % profile,
+                                            "privateKeyFile": "/etc/pki/%s.key" % profile}
+        nodes.append(node)
+
+    links = []
+    if shape == "mesh":
+        for s in range(routers):
+            for t in range(s + 1, routers):
+                links.append({"source": s, "target": t, "cls": "small"})
+    elif shape == "hub":
+        for t in range(1, routers):
+            links.append({"source": 0, "target": t, "cls": "small"})
+    else:
+        for s in range(core):
+            for t in range(s + 1, core):
+                links.append({"source": s, "target": t, "cls": "small"})
+        for t in range(core, routers):
+            links.append({"source": t % core, "target": t, "cls": "small"})
+
+    return {"nodes": nodes, "links": links, "settings": {"http_port": 5675, "internal_port": 20000,
+                                                          "default_host": "0.0.0.0"}}
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic topology and publish it.')
+    parser.add_argument("shape", choices=shapes)
+    parser.add_argument("routers", type=int)
+    parser.add_argument("topology", help="name of the topology directory to publish to")
+    parser.add_argument("--listeners", type=int, default=1, help="normal listeners per router (default: %(default)s)")
+    parser.add_argument("--addresses", type=int, default=2, help="addresses per router (default: %(default)s)")
+    parser.add_argument("--ssl-profiles", type=int, default=0, help="sslProfiles per router (default: %(default)s)")
+    parser.add_argument("--hosts", type=int, default=10, help="number of hosts to spread the routers over (default: %(default)s)")
+    parser.add_argument("--topologies", default="topologies/", help="directory to publish to (default: %(default)s)")
+    parser.add_argument("--json", metavar="FILE", help="save the topology the way the console sends it to FILE instead of publishing it")
+    args = parser.parse_args()
+
+    import os
+    request = generate(args.shape, args.routers, args.listeners, args.addresses, args.ssl_profiles, args.hosts)
+    request["topology"] = args.topology
+    if args.json:
+        import json
+        with open(args.json, 'w') as fout:
+            json.dump(request, fout)
+        return
+
+    from config import Manager
+    manager = Manager(args.topology, False, topo_base=os.path.join(args.topologies, ''))
+    tdir = manager.topo_base + args.topology
+    if not os.path.exists(tdir):
+        os.makedirs(tdir)
+    summary = manager.PUBLISH(request)
+    print ("%s: %d routers, %d links, %d files written" %
+           (tdir, len(request["nodes"]), len(request["links"]), len(summary["added"]) + len(summary["changed"])))
+
+if __name__ == '__main__':
+    main()
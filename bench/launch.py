@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+# Launch generated topologies with stub routers, one at a time and in parallel.
+# --delay is how long each stub router takes to open its ports.
+# Run from the top level directory: python -m bench.launch --delay 0.5
+
+import argparse
+import copy
+import os
+import shutil
+import sys
+import tempfile
+
+from bench.generate import generate
+from config import Manager
+from mock.launch import Launcher
+
+def main():
+    parser = argparse.ArgumentParser(description='Launch generated topologies with stub routers.')
+    parser.add_argument("-s", "--sizes", type=int, nargs='+', default=[20, 200],
+                        help="number of routers (default: %(default)s)")
+    parser.add_argument("--parallel", type=int, nargs='+', default=[1, 32],
+                        help="routers started at once (default: %(default)s)")
+    parser.add_argument("--delay", type=float, default=0.2, help="seconds each stub router takes to start (default: %(default)s)")
+    args = parser.parse_args()
+
+    stub = [sys.executable, os.path.join(os.getcwd(), "bench", "stubrouter.py"), "--delay", str(args.delay)]
+    env = os.environ.get("PYTHONPATH")
+    # the stub imports mock
+    os.environ["PYTHONPATH"] = os.getcwd() + (os.pathsep + env if env else "")
+    cwd = os.getcwd()
+    tmp = tempfile.mkdtemp()
+    try:
+        os.chdir(tmp)
+        print ("%8s %8s %10s %10s %10s %8s" % ("routers", "parallel", "elapsed", "median", "slowest", "ready"))
+        for size in args.sizes:
+            topology = "core-edge-%d" % size
+            os.makedirs("topologies/" + topology)
+            request = generate("core-edge", size, 1, 0, 0, hosts=1)
+            request["topology"] = topology
+            Manager(topology, False).PUBLISH(copy.deepcopy(request))
+            for parallel in args.parallel:
+                launcher = Launcher(stub, parallel)
+                launched = launcher.start("topologies/%s/" % topology)
+                latencies = sorted(r['latency'] for r in launched['routers'].values() if r['state'] == "READY")
+                launcher.stop("topologies/%s/" % topology)
+                print ("%8d %8d %9.2fs %8.1fms %8.1fms %8d" % (size, parallel, launched['elapsed'],
+                       latencies[len(latencies) // 2] * 1000 if latencies else 0,
+                       latencies[-1] * 1000 if latencies else 0, len(latencies)))
+            shutil.rmtree("topologies/" + topology)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp)
+
+if __name__ == '__main__':
+    main()
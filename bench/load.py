@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+# Time Manager.LOAD and its link reconstruction on generated meshes.
+# Run from the top level directory: python -m bench.load
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from config import Manager, DirectoryConfigs
+from mock.cache import config_cache
+
+def write_mesh(path, routers, degree=3, hosts=10):
+    """Write a mesh where each router connects to the listeners of the previous `degree` routers.
+
+    Routers are spread across `hosts` hosts and listener ports are reused on every
+    host, so links can only be rebuilt correctly by matching on (host, port).
+    """
+    def host(i):
+        return "10.0.0.%d" % (i % hosts + 1)
+    def port(i):
+        return 20000 + i // hosts
+
+    for i in range(routers):
+        out = ["router {", "    #deploy_host: %s" % host(i), "    mode: interior", "    id: R%d" % i, "}",
+               "listener {", "    host: 0.0.0.0", "    role: inter-router", "    port: %d" % port(i), "}"]
+        for j in range(max(0, i - degree), i):
+            out += ["connector {", "    host: %s" % host(j), "    role: inter-router", "    port: %d" % port(j), "}"]
+        with open(os.path.join(path, "R%d.conf" % i), "w") as f:
+            f.write("\n".join(out) + "\n")
+
+def legacy_links(port_map):
+    """The original quadratic port scan"""
+    port_map = [{'listeners': [p for h, p in ports['listeners']], 'connectors': [p for h, p in ports['connectors']]}
+                for ports in port_map]
+    links = []
+    for source, ports_for_this_routers in enumerate(port_map):
+        for listener_port in ports_for_this_routers['listeners']:
+            for target, ports_for_other_routers in enumerate(port_map):
+                if listener_port in ports_for_other_routers['connectors']:
+                    links.append({'source': source, 'target': target, 'dir': "in"})
+    return links
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark LOAD link reconstruction on generated meshes.')
+    parser.add_argument("-s", "--sizes", type=int, nargs='+', default=[10, 100, 1000, 2000, 10000],
+                        help="number of routers (default: %(default)s)")
+    parser.add_argument("--legacy-max", type=int, default=2000,
+                        help="largest mesh to run the quadratic scan on (default: %(default)s)")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    tmp = tempfile.mkdtemp()
+    try:
+        os.chdir(tmp)
+        print ("%8s %8s %12s %12s %12s" % ("routers", "links", "LOAD (ms)", "links (ms)", "legacy (ms)"))
+        for size in args.sizes:
+            topology = "mesh-%d" % size
+            os.makedirs(os.path.join("topologies", topology))
+            write_mesh(os.path.join("topologies", topology), size)
+            manager = Manager(topology, False)
+            # warm the parse cache so the timing is dominated by LOAD itself
+            config_cache.clear()
+            manager.LOAD({"topology": topology})
+
+            start = time.time()
+            result = manager.LOAD({"topology": topology})
+            load = time.time() - start
+
+            # rebuild the port map LOAD builds so the link step can be timed on its own
+            dc = DirectoryConfigs('./topologies/' + topology + '/')
+            port_map = []
+            for sections in dc.configs.values():
+                ports = {'listeners': [], 'connectors': [], 'host': None}
+                for t, entries in sections:
+                    if t == 'router':
+                        ports['host'] = entries.get('deploy_host')
+                    elif t in ('listener', 'connector'):
+                        ports[t + 's'].append((entries.get('host'), entries.get('port')))
+                port_map.append(ports)
+            start = time.time()
+            manager._links_(port_map)
+            links = time.time() - start
+
+            legacy = "-"
+            if size <= args.legacy_max:
+                start = time.time()
+                legacy_links(port_map)
+                legacy = "%.1f" % ((time.time() - start) * 1000)
+
+            print ("%8d %8d %12.1f %12.1f %12s" % (size, len(result["links"]), load * 1000, links * 1000, legacy))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+# Compare the streaming config parser against the original regex-to-json parser.
+# Run from the top level directory: python -m bench.parse
+
+import argparse
+import io
+import json
+import re
+import timeit
+
+from mock.parser import parse
+
+def legacy_parse(lines):
+    """The original regex-to-json _parse, kept here as the baseline"""
+    begin = re.compile(r'([\w-]+)[ \t]*{') # WORD {
+    end = re.compile(r'}')                 # }
+    attr = re.compile(r'([\w-]+)[ \t]*:[ \t]*(.+)') # WORD1: VALUE
+    pattern = re.compile(r'([\w-]+)[ \t]*:[ \t]*([\S]+).*')
+
+    def sub(line):
+        line = line.strip()
+        if line.startswith("#"):
+            if line.startswith("#deploy_host:"):
+                line = line[1:]
+            else:
+                return ""
+        if line.split(':')[0].strip().lower() == "pattern":
+            line = re.sub(pattern, r'"\1": "\2",', line)
+        else:
+            line = line.split('#')[0].strip()
+            line = re.sub(begin, r'["\1", {', line)
+            line = re.sub(end, r'}],', line)
+            line = re.sub(attr, r'"\1": "\2",', line)
+        return line
+
+    js_text = "[%s]"%("\n".join([sub(l) for l in lines]))
+    spare_comma = re.compile(r',\s*([]}])')
+    js_text = re.sub(spare_comma, r'\1', js_text)
+    return json.loads(js_text)
+
+def synthetic_config(sections):
+    """Return the text of a router config file with about the given number of sections"""
+    out = ["router {", "    #deploy_host: 10.0.0.1", "    mode: interior", "    id: R0", "}"]
+    for i in range(sections):
+        kind = i % 4
+        if kind == 0:
+            out += ["", "# listener %d" % i, "listener {", "    host: 0.0.0.0",
+                    "    role: inter-router", "    saslMechanisms: ANONYMOUS", "    port: %d" % (20000 + i), "}"]
+        elif kind == 1:
+            out += ["connector {", "    host: 10.0.%d.%d" % (i // 250, i % 250), "    role: inter-router",
+                    "    port: %d  # trailing comment" % (20000 + i), "}"]
+        elif kind == 2:
+            out += ["address {", "    pattern: a/#/b%d extra" % i, "    distribution: closest", "}"]
+        else:
+            out += ["log {", "    module: ROUTER", "    enable: trace+", "}"]
+    return "\n".join(out) + "\n"
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the config file parser.')
+    parser.add_argument("-n", "--number", type=int, default=5, help="timing repetitions (default: %(default)s)")
+    parser.add_argument("-s", "--sizes", type=int, nargs='+', default=[10, 100, 1000, 10000],
+                        help="sections per synthetic file (default: %(default)s)")
+    args = parser.parse_args()
+
+    print ("%10s %12s %12s %8s" % ("sections", "legacy (ms)", "stream (ms)", "speedup"))
+    for size in args.sizes:
+        text = synthetic_config(size)
+        assert parse(io.StringIO(text)) == legacy_parse(io.StringIO(text))
+        legacy = min(timeit.repeat(lambda: legacy_parse(io.StringIO(text)), number=1, repeat=args.number))
+        stream = min(timeit.repeat(lambda: parse(io.StringIO(text)), number=1, repeat=args.number))
+        print ("%10d %12.3f %12.3f %7.1fx" % (size, legacy * 1000, stream * 1000, legacy / stream))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+# Time and measure the memory of each stage of the config pipeline on generated
+# topologies, save the results as json and compare them against an earlier run.
+# Run from the top level directory: python -m bench.pipeline --compare old.json
+
+import argparse
+import copy
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from bench.generate import generate, shapes
+from config import Manager, DirectoryConfigs
+from mock.cache import config_cache
+from mock.parser import parse
+from mock.topology import Topology
+
+def stages(manager, request):
+    """Return the (name, function) pairs to measure, in pipeline order"""
+    topology = request["topology"]
+    tdir = manager.topo_base + topology + "/"
+    settings = request["settings"]
+    state = {}
+
+    def connect():
+        topology = Topology.from_request(request["nodes"], request["links"])
+        manager._connect_(topology, settings["default_host"], settings["internal_port"])
+
+    def publish():
+        for f in os.listdir(tdir):
+            os.remove(tdir + f)
+        manager.PUBLISH(copy.deepcopy(request))
+
+    def republish():
+        manager.PUBLISH(copy.deepcopy(request))
+
+    def parse_files():
+        for f in sorted(os.listdir(tdir)):
+            with open(tdir + f) as fin:
+                parse(fin)
+
+    def directory_cold():
+        config_cache.clear()
+        state["dc"] = DirectoryConfigs('./' + tdir)
+
+    def directory_warm():
+        DirectoryConfigs('./' + tdir)
+
+    def load():
+        manager.LOAD({"topology": topology})
+
+    def render():
+        dc = state["dc"]
+        for sections in dc.configs.values():
+            out = []
+            for s in sections:
+                section = dc.asSection([s[0], dict(s[1])])
+                if section:
+                    section.render(out)
+            ''.join(out)
+
+    return [("_connect_", connect), ("PUBLISH", publish), ("PUBLISH unchanged", republish),
+            ("_parse", parse_files), ("DirectoryConfigs cold", directory_cold),
+            ("DirectoryConfigs warm", directory_warm), ("LOAD", load), ("render", render)]
+
+def measure(fn, memory):
+    start = time.time()
+    fn()
+    elapsed = time.time() - start
+    peak = None
+    if memory:
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed, peak
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], universal_newlines=True).strip()
+    except Exception:
+        return None
+
+def compare(results, previous, threshold):
+    before = dict(((r["shape"], r["routers"], r["stage"]), r) for r in previous["results"])
+    print ("\n%-10s %7s %-22s %10s %10s %8s" % ("shape", "routers", "stage", "before", "after", "change"))
+    for r in results:
+        old = before.get((r["shape"], r["routers"], r["stage"]))
+        if not old or not old["seconds"]:
+            continue
+        ratio = r["seconds"] / old["seconds"]
+        flag = "  REGRESSION" if ratio > 1 + threshold else ""
+        print ("%-10s %7d %-22s %9.1fms %9.1fms %7.0f%%%s" %
+               (r["shape"], r["routers"], r["stage"], old["seconds"] * 1000, r["seconds"] * 1000, (ratio - 1) * 100, flag))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark each stage of the config pipeline.')
+    parser.add_argument("-s", "--sizes", type=int, nargs='+', default=[10, 100, 1000, 10000],
+                        help="number of routers (default: %(default)s)")
+    parser.add_argument("--shapes", nargs='+', choices=shapes, default=list(shapes), help="topology shapes (default: all)")
+    parser.add_argument("--mesh-max", type=int, default=100,
+                        help="largest full mesh to generate, since its links grow with the square of its size (default: %(default)s)")
+    parser.add_argument("--listeners", type=int, default=1, help="normal listeners per router (default: %(default)s)")
+    parser.add_argument("--addresses", type=int, default=2, help="addresses per router (default: %(default)s)")
+    parser.add_argument("--ssl-profiles", type=int, default=1, help="sslProfiles per router (default: %(default)s)")
+    parser.add_argument("--no-memory", action='store_true', help="skip the tracemalloc pass of each stage")
+    parser.add_argument("-o", "--output", default="bench-results.json", help="file to save the results to (default: %(default)s)")
+    parser.add_argument("--compare", help="results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown reported as a regression (default: %(default)s)")
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as fin:
+            previous = json.load(fin)
+    output = os.path.abspath(args.output)
+
+    results = []
+    cwd = os.getcwd()
+    tmp = tempfile.mkdtemp()
+    try:
+        os.chdir(tmp)
+        print ("%-10s %7s %7s %-22s %10s %10s" % ("shape", "routers", "links", "stage", "time", "peak mem"))
+        for shape in args.shapes:
+            for size in args.sizes:
+                if shape == "mesh" and size > args.mesh_max:
+                    continue
+                topology = "%s-%d" % (shape, size)
+                request = generate(shape, size, args.listeners, args.addresses, args.ssl_profiles)
+                request["topology"] = topology
+                os.makedirs("topologies/" + topology)
+                manager = Manager(topology, False)
+                for stage, fn in stages(manager, request):
+                    elapsed, peak = measure(fn, not args.no_memory)
+                    results.append({"shape": shape, "routers": size, "links": len(request["links"]),
+                                    "stage": stage, "seconds": elapsed, "peak_bytes": peak})
+                    print ("%-10s %7d %7d %-22s %8.1fms %10s" % (shape, size, len(request["links"]), stage, elapsed * 1000,
+                                                               "-" if peak is None else "%.1fMB" % (peak / 1e6)))
+                shutil.rmtree("topologies/" + topology)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp)
+
+    with open(output, "w") as fout:
+        json.dump({"revision": git_revision(), "python": platform.python_version(), "time": time.time(),
+                   "results": results}, fout, indent=2)
+    print ("results saved to", args.output)
+
+    if previous:
+        compare(results, previous, args.threshold)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+# Check that ConfigSection.render writes exactly what the old json.dumps based
+# __repr__ did, then time both on a generated topology.
+# Run from the top level directory: python -m bench.render
+
+import argparse
+import json
+import re
+import time
+
+from mock.schema import Schema
+from mock.section import RouterSection, ListenerSection, ConnectorSection, AddressSection, LogSection
+
+def legacy_repr(section):
+    """The original ConfigSection/RouterSection __repr__, without modifying the section"""
+    entries = {k: v for k, v in section.entries.items() if section.entries.get(k)}
+    raw = re.sub('["]', '', section.type + " " + json.dumps(entries, indent=4, separators=('', ': ')))
+    if isinstance(section, RouterSection):
+        raw = raw.replace('deploy_host', '#deploy_host', 1)
+    return raw
+
+def node_sections(i):
+    r = RouterSection("R%d" % i, mode="interior")
+    r.setEntry("deploy_host", "10.0.%d.%d" % (i // 250, i % 250))
+    return [r,
+            ListenerSection(20000 + i, host="0.0.0.0", saslMechanisms="ANONYMOUS"),
+            ListenerSection(5673, http=True, name="Console Listener"),
+            ListenerSection(2000, host="0.0.0.0", role="inter-router"),
+            ConnectorSection(2000, host="10.0.0.%d" % (i % 250), role="inter-router"),
+            AddressSection(prefix="closest/%d" % i, distribution="closest"),
+            LogSection(module="ROUTER", enable="trace+", includeSource=False)]
+
+def odd_sections():
+    """Values that json.dumps has to escape or nest"""
+    return [ListenerSection(1, name='quote " and back\\slash'),
+            ListenerSection(2, name=u'café ☃'),
+            ListenerSection(3, name="tab\there", idleTimeoutSeconds=0, linkCapacity=250),
+            AddressSection(pattern="a/#/b", ingressPhase=2, waypoint=True),
+            RouterSection("empty"),
+            LogSection()]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark config section rendering.')
+    parser.add_argument('-n', "--nodes", type=int, default=10000, help="routers in the topology (default: %(default)s)")
+    args = parser.parse_args()
+
+    Schema.init()
+    nodes = [node_sections(i) for i in range(args.nodes)]
+    odd = odd_sections()
+    odd[-1].setEntry("enable", ["a", {"b": 1}])
+    for section in odd + [s for node in nodes[:100] for s in node]:
+        assert repr(section) == legacy_repr(section), (repr(section), legacy_repr(section))
+
+    start = time.time()
+    legacy = [''.join([legacy_repr(s) + "\n" for s in node]) for node in nodes]
+    legacy_time = time.time() - start
+
+    start = time.time()
+    rendered = []
+    for node in nodes:
+        out = []
+        for s in node:
+            s.render(out)
+            out.append("\n")
+        rendered.append(''.join(out))
+    render_time = time.time() - start
+
+    assert legacy == rendered
+    print ("%d nodes: %.1f ms with json.dumps + re.sub, %.1f ms with render (%.1fx)" %
+           (args.nodes, legacy_time * 1000, render_time * 1000, legacy_time / render_time))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+# Time section construction with list based schema lookups against the compiled index,
+# and Schema.init with and without the compiled cache.
+# Run from the top level directory: python -m bench.schema
+
+import argparse
+import os
+import timeit
+
+from mock.schema import Schema
+from mock.section import ConfigSection, ListenerSection
+
+def legacy_filter(type, defaults, ignore, forced, opts):
+    """The option filtering ConfigSection.__init__ used to do"""
+    for key in defaults:
+        if not key in opts:
+            opts[key] = defaults[key]
+    for key in list(opts.keys()):
+        if not key in Schema.attrs(type):
+            del opts[key]
+        elif key.endswith('Count') or key in ignore or opts[key] is None:
+            del opts[key]
+        elif opts[key] == Schema.default(type, key) and key not in forced:
+            del opts[key]
+    return opts
+
+def listener_opts():
+    return {"host": "0.0.0.0", "role": "inter-router", "saslMechanisms": "ANONYMOUS", "port": "2000",
+            "authenticatePeer": "no", "idleTimeoutSeconds": "16", "linkCapacity": "250", "http": "true",
+            "name": "Console Listener", "connectionCount": "3", "bogus": "x"}
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark schema lookups during section construction.')
+    parser.add_argument('-n', "--number", type=int, default=100000, help="sections to construct (default: %(default)s)")
+    args = parser.parse_args()
+
+    if os.path.exists(Schema.cache_file):
+        os.remove(Schema.cache_file)
+    cold = timeit.timeit(Schema.init, number=1)
+    warm = min(timeit.repeat(Schema.init, number=1, repeat=5))
+    print ("Schema.init: %.2f ms from schema.json, %.2f ms from %s" % (cold * 1000, warm * 1000, Schema.cache_file))
+
+    assert legacy_filter("listener", ListenerSection.defaults, [], [], listener_opts()) == \
+        ListenerSection(**listener_opts()).entries
+    legacy = timeit.timeit(lambda: legacy_filter("listener", ListenerSection.defaults, [], [], listener_opts()), number=args.number)
+    compiled = timeit.timeit(lambda: ConfigSection("listener", ListenerSection.defaults, [], [], listener_opts()), number=args.number)
+    print ("%d listener sections: %.1f ms with list lookups, %.1f ms with the compiled index" %
+           (args.number, legacy * 1000, compiled * 1000))
+
+if __name__ == '__main__':
+    main()
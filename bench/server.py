@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+# Load test the config server with concurrent keep-alive clients.
+# Run from the top level directory: python -m bench.server
+# or point it at a running server with --url
+
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlparse
+
+def client(url, operations, requests, latencies, errors):
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=60)
+    for i in range(requests):
+        body = json.dumps(operations[i % len(operations)])
+        start = time.time()
+        try:
+            conn.request("POST", "/", body, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+        except Exception as e:
+            errors.append(str(e))
+            conn.close()
+            conn = http.client.HTTPConnection(url.hostname, url.port, timeout=60)
+        latencies.append(time.time() - start)
+    conn.close()
+
+def run(url, clients, requests, operations):
+    latencies = []
+    errors = []
+    threads = [threading.Thread(target=client, args=(url, operations, requests, latencies, errors))
+               for c in range(clients)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+    latencies.sort()
+    return {"clients": clients,
+            "requests": len(latencies),
+            "errors": len(errors),
+            "rps": len(latencies) / elapsed,
+            "p50": latencies[len(latencies) // 2] * 1000,
+            "p99": latencies[int(len(latencies) * 0.99)] * 1000}
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure config server request throughput under concurrent clients.')
+    parser.add_argument("--url", help="url of a running server. If not given one is started in this process")
+    parser.add_argument('-w', "--workers", type=int, default=8, help="worker threads for the in-process server (default: %(default)s)")
+    parser.add_argument('-c', "--clients", type=int, nargs='+', default=[1, 4, 16], help="concurrent clients (default: %(default)s)")
+    parser.add_argument('-n', "--requests", type=int, default=200, help="requests per client (default: %(default)s)")
+    parser.add_argument("-t", "--topology", default="config-2", help="topology to LOAD (default: %(default)s)")
+    args = parser.parse_args()
+
+    httpd = None
+    if args.url:
+        url = urlparse(args.url)
+    else:
+        from config import Manager
+        from mock.server import ConfigTCPServer, HttpHandler
+        # silence the per-request logging so it doesn't dominate the measurement
+        HttpHandler.log_message = lambda *a: None
+        httpd = ConfigTCPServer(0, Manager(args.topology, False), False, args.workers)
+        threading.Thread(target=httpd.serve_forever).start()
+        url = urlparse("http://localhost:%d/" % httpd.server_address[1])
+
+    operations = [{"operation": "LOAD", "topology": args.topology},
+                  {"operation": "GET-SCHEMA"},
+                  {"operation": "GET-TOPOLOGY-LIST"}]
+    try:
+        print ("%8s %9s %7s %10s %9s %9s" % ("clients", "requests", "errors", "req/s", "p50 (ms)", "p99 (ms)"))
+        for clients in args.clients:
+            r = run(url, clients, args.requests, operations)
+            print ("%(clients)8d %(requests)9d %(errors)7d %(rps)10.1f %(p50)9.2f %(p99)9.2f" % r)
+    finally:
+        if httpd:
+            httpd.shutdown()
+            httpd.server_close()
+
+if __name__ == '__main__':
+    main()
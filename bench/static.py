@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+# Measure how many console page loads a second the server can handle. A page load
+# is index.html and every script and stylesheet it refers to that is on disk.
+# Run from the top level directory: python -m bench.static
+
+import argparse
+import http.client
+import http.server
+import os
+import re
+import threading
+import time
+
+from config import Manager
+from mock.response import StaticFiles
+from mock.server import ConfigTCPServer, HttpHandler
+
+def page():
+    with open("index.html") as fin:
+        refs = re.findall(r'(?:src|href)="([^":]+\.(?:js|css))"', fin.read())
+    return ["/"] + ["/" + r for r in refs if os.path.isfile(r)]
+
+def client(port, paths, loads, headers, revalidate, results):
+    conn = http.client.HTTPConnection("localhost", port, timeout=60)
+    etags = {}
+    for i in range(loads):
+        start = time.time()
+        size = 0
+        for path in paths:
+            h = dict(headers)
+            if revalidate and path in etags:
+                h['If-None-Match'] = etags[path]
+            conn.request("GET", path, headers=h)
+            response = conn.getresponse()
+            size += len(response.read())
+            if response.status == 200:
+                etags[path] = response.getheader('ETag')
+            elif response.status != 304:
+                results['errors'] += 1
+        results['latencies'].append(time.time() - start)
+        results['bytes'] += size
+    conn.close()
+
+def run(port, paths, clients, loads, headers, revalidate):
+    results = {'latencies': [], 'bytes': 0, 'errors': 0}
+    threads = [threading.Thread(target=client, args=(port, paths, loads, headers, revalidate, results))
+               for c in range(clients)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+    latencies = sorted(results['latencies'])
+    return {"loads": len(latencies) / elapsed, "requests": len(latencies) * len(paths) / elapsed,
+            "p50": latencies[len(latencies) // 2] * 1000, "kb": results['bytes'] / len(latencies) / 1024,
+            "errors": results['errors']}
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure console page loads a second.')
+    parser.add_argument('-w', "--workers", type=int, default=8, help="worker threads for the server (default: %(default)s)")
+    parser.add_argument('-c', "--clients", type=int, nargs='+', default=[1, 8], help="concurrent clients (default: %(default)s)")
+    parser.add_argument('-n', "--loads", type=int, default=100, help="page loads per client (default: %(default)s)")
+    args = parser.parse_args()
+
+    paths = page()
+    HttpHandler.log_message = lambda *a: None
+    disk = HttpHandler.send_static
+    httpd = ConfigTCPServer(0, Manager("config-2", False), False, args.workers)
+    threading.Thread(target=httpd.serve_forever).start()
+    port = httpd.server_address[1]
+
+    gzip = {'Accept-Encoding': 'gzip'}
+    # name, assets, how each file is sent, request headers, revalidate with ETags
+    variants = [("read from disk", None, None, {}, False),
+                ("sendfile", StaticFiles(0), disk, {}, False),
+                ("memory", StaticFiles(), disk, {}, False),
+                ("memory+gzip", StaticFiles(), disk, gzip, False),
+                ("revalidate", StaticFiles(), disk, gzip, True)]
+    try:
+        print ("%d files a page" % len(paths))
+        print ("%-16s %8s %10s %10s %9s %9s" % ("", "clients", "loads/s", "req/s", "p50 (ms)", "KB/load"))
+        for name, assets, send, headers, revalidate in variants:
+            # read from disk is how files were sent before they were cached
+            HttpHandler.send_static = send or (lambda self, path: http.server.SimpleHTTPRequestHandler.do_GET(self))
+            httpd.assets = assets
+            for clients in args.clients:
+                r = run(port, paths, clients, args.loads, headers, revalidate)
+                print ("%-16s %8d %10.1f %10.1f %9.2f %9.1f%s" % (name, clients, r['loads'], r['requests'], r['p50'], r['kb'],
+                       " (%d errors)" % r['errors'] if r['errors'] else ""))
+    finally:
+        HttpHandler.send_static = disk
+        httpd.shutdown()
+        httpd.server_close()
+
+if __name__ == '__main__':
+    main()
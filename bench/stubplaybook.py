@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+# Stands in for ansible-playbook: reads the inventory DEPLOY writes for a batch
+# and prints the plays and recap ansible would for its hosts, without touching them.
+# Run from the top level directory: python -m config --deploy-command "python bench/stubplaybook.py"
+
+import argparse
+import json
+import sys
+import time
+
+import yaml
+
+def main():
+    parser = argparse.ArgumentParser(description='Pretend to run a playbook over the hosts of an inventory.')
+    parser.add_argument("playbook")
+    parser.add_argument("-i", "--inventory", required=True, help="inventory file")
+    parser.add_argument("--delay", type=float, default=0, help="seconds each host takes (default: %(default)s)")
+    parser.add_argument("--fail", action='append', default=[], metavar="HOST", help="host to fail, may be repeated")
+    parser.add_argument("--record", metavar="FILE", help="append the inventory to FILE as a line of JSON")
+    args = parser.parse_args()
+
+    with open(args.inventory) as fin:
+        inventory = yaml.safe_load(fin)
+    if args.record:
+        with open(args.record, 'a') as fout:
+            fout.write(json.dumps(inventory) + "\n")
+
+    hosts = {}
+    for group in inventory.values():
+        hosts.update(group['hosts'])
+    print ("\nPLAY [%s] %s" % (args.playbook, "*" * 40), flush=True)
+    failed = []
+    for host, h in hosts.items():
+        time.sleep(args.delay)
+        if host in args.fail:
+            print ("fatal: [%s]: FAILED! => {\"msg\": \"stub failure\"}" % host, flush=True)
+            failed.append(host)
+            continue
+        for name in h.get('nodes', []):
+            print ("changed: [%s] => (item=%s)" % (host, name), flush=True)
+        for name in h.get('retired', []):
+            print ("changed: [%s] => (item=%s retired)" % (host, name), flush=True)
+        if h.get('create_console'):
+            print ("changed: [%s] => (console)" % host, flush=True)
+
+    print ("\nPLAY RECAP %s" % ("*" * 40))
+    for host in hosts:
+        print ("%-26s : ok=%d changed=%d unreachable=0 failed=%d" %
+               (host, host not in failed, host not in failed, host in failed))
+    sys.exit(2 if failed else 0)
+
+if __name__ == '__main__':
+    main()
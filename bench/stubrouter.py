@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+# Stands in for qdrouterd: opens the ports of the listeners in a config file
+# and accepts connections on them until it is terminated.
+# Run from the top level directory: python -m bench.stubrouter -c topologies/config-2/A.conf
+
+import argparse
+import selectors
+import socket
+import time
+
+from mock.parser import parse
+from mock.topology import localHosts
+
+def main():
+    parser = argparse.ArgumentParser(description='Open the listener ports of a router config file.')
+    parser.add_argument("-c", "--config", required=True, help="router config file")
+    parser.add_argument("--delay", type=float, default=0, help="seconds to wait before opening the ports (default: %(default)s)")
+    args = parser.parse_args()
+
+    with open(args.config) as fin:
+        sections = parse(fin)
+    time.sleep(args.delay)
+
+    selector = selectors.DefaultSelector()
+    for sect in sections:
+        if sect[0] == 'listener':
+            host = sect[1].get('host')
+            port = sect[1].get('port', 'amqp')
+            port = 5672 if port == 'amqp' else int(port)
+            # like qdrouterd, fails if a port can't be opened
+            sock = socket.create_server(("" if not host or host in localHosts else host, port))
+            selector.register(sock, selectors.EVENT_READ)
+    print ("listening on", len(selector.get_map()), "ports", flush=True)
+
+    while True:
+        for key, events in selector.select(timeout=None):
+            key.fileobj.accept()[0].close()
+
+if __name__ == '__main__':
+    main()
@@ -18,90 +18,94 @@
 # under the License.
 #
 
-import argparse
-from pprint import pprint
-import os, sys, inspect, traceback
-import string
-import random
+import json
+import os
+import stat
+import sys
+import hashlib
+import tempfile
+import threading
+import time
+from collections import OrderedDict
 from glob import glob
-from mock.section import RouterSection, ListenerSection, ConnectorSection
+from fnmatch import fnmatchcase
+from shutil import which
+# the section classes are looked up by name with get_class, which pyflakes can't see
+from mock.section import RouterSection, ListenerSection, ConnectorSection, SslProfileSection, LogSection, AddressSection  # noqa: F401
 from mock.schema import Schema
-import http.server
-import socketserver
-
-import json, re
-import io
-import yaml
-import threading
-import subprocess
-from distutils.spawn import find_executable
-from builtins import str
-import pdb;
+from mock.cache import config_cache
+from mock.deploylog import DeployLog
+from mock.artifacts import DeployArtifacts
+from mock.deploy import DeployScheduler
+from mock.edit import EditedTopology, EditError
+from mock.response import FileResponse, PreparedResponse
+from mock.metrics import metrics
+from mock.topology import Node, Ports, Topology, connect, resolve, localHosts
+# the HTTP server, launcher, watcher and SQLite store are imported when they are first used,
+# so scripts that only publish or load topologies start quickly
 
 get_class = lambda x: globals()[x]
 sectionKeys = {"log": "module", "sslProfile": "name", "connector": "port", "listener": "port", "address": "prefix|pattern"}
 
-# modified from qpid-dispatch/python/qpid_dispatch_internal/management/config.py
-def _parse(lines):
-    """Parse config file format into a section list"""
-    begin = re.compile(r'([\w-]+)[ \t]*{') # WORD {
-    end = re.compile(r'}')                 # }
-    attr = re.compile(r'([\w-]+)[ \t]*:[ \t]*(.+)') # WORD1: VALUE
-    pattern = re.compile(r'([\w-]+)[ \t]*:[ \t]*([\S]+).*')
-
-    def sub(line):
-        """Do substitutions to make line json-friendly"""
-        line = line.strip()
-        if line.startswith("#"):
-            if line.startswith("#deploy_host:"):
-                line = line[1:]
-            else:
-                return ""
-        # 'pattern:' is a special snowflake.  It allows '#' characters in
-        # its value, so they cannot be treated as comment delimiters
-        if line.split(':')[0].strip().lower() == "pattern":
-            line = re.sub(pattern, r'"\1": "\2",', line)
-        else:
-            line = line.split('#')[0].strip()
-            line = re.sub(begin, r'["\1", {', line)
-            line = re.sub(end, r'}],', line)
-            line = re.sub(attr, r'"\1": "\2",', line)
-        return line
-
-    js_text = "[%s]"%("\n".join([sub(l) for l in lines]))
-    spare_comma = re.compile(r',\s*([]}])') # Strip spare commas
-    js_text = re.sub(spare_comma, r'\1', js_text)
-    # Convert dictionary keys to camelCase
-    sections = json.loads(js_text)
-    #Config.transform_sections(sections)
-    return sections
-
 class DirectoryConfigs(object):
     def __init__(self, path='./'):
         self.path = path
         self.configs = {}
 
         files = glob(path + '*.conf')
-        for file in files:
-            with open(file) as f:
-                self.configs[file] = _parse(f)
+        for file, sections in zip(files, config_cache.get_many(files)):
+            self.configs[file] = sections
+        config_cache.save()
 
-    def asSection(self, s):
+    @staticmethod
+    def asSection(s):
         cname = s[0][0].upper() + s[0][1:] + "Section"
         try:
             c = get_class(cname)
             return c(**s[1])
-        except KeyError as e:
+        except KeyError:
             return None
 
 class Manager(object):
-    def __init__(self, topology, verbose):
+    plan_cache_size = 8
+
+    # watch is None or the Watcher options used to follow edits to the current topology's files.
+    # store is "files" to keep each topology as .conf files or "sqlite" to keep it in a TopologyStore.
+    # launcher starts the routers of a topology on this host. topo_base is the directory
+    # the topologies are kept in, ending in /. deploy_command is run in place of ansible-playbook
+    def __init__(self, topology, verbose, deploy_parallel=4, deploy_batch=1, watch=None, store="files", launcher=None,
+                 topo_base="topologies/", deploy_command="ansible-playbook"):
         self.topology = topology
         self.verbose = verbose
-        self.topo_base = "topologies/"
+        self.topo_base = topo_base
         self.deploy_base = "deployments/"
         self.deploy_file = self.deploy_base + "deploy.txt"
+        self.deploy_log = DeployLog(self.deploy_file)
+        self.deployer = DeployScheduler(self.deploy_log, self.deploy_file, deploy_parallel, deploy_batch, deploy_command)
+        self.artifacts = DeployArtifacts(self.deploy_base + "artifacts/")
+        # the stand-alone console that is installed on hosts with a console listener
+        self.console_dir = "../stand-alone"
+        self.launcher = launcher
+        self.schema_file = FileResponse("schema.json")
         self.state = None
+        # sha1 of each published config file, keyed by path
+        self.digests = {}
+        # the index of the current topology, if it is being watched
+        self.watch = watch
+        self.store = store
+        self.live = None
+        self.watcher = None
+        # connection plans of recently shown or published topologies
+        self.plans = OrderedDict()
+        # the listener ports each topology was last published with
+        self.assigned = {}
+        # the topology each console last sent with SYNC, with the changes it sent since
+        self.edited = {}
+        # guards the fields above. Each topology also has its own lock
+        self.lock = threading.Lock()
+        self.topology_locks = {}
+        if watch is not None:
+            self._watch_(topology)
 
     def operation(self, op, request):
         m = op.replace("-", "_")
@@ -112,12 +116,68 @@ class Manager(object):
             return None
         if self.verbose:
             print ("Got request " + op)
-        return method(request)
+        # requests for the same topology are run one at a time, others run concurrently
+        topology = request.get("topology")
+        with metrics.operation(m, request.get("profile")):
+            if topology is None:
+                return method(request)
+            with self.topology_lock(topology):
+                if "base" in request:
+                    resync = self._edit_(request)
+                    if resync is not None:
+                        return resync
+                return method(request)
+
+    def topology_lock(self, topology):
+        with self.lock:
+            if topology not in self.topology_locks:
+                self.topology_locks[topology] = threading.RLock()
+            return self.topology_locks[topology]
+
+    # keep the nodes, links and settings of a topology so later requests can send only the
+    # changes made since, along with the revision they were made to as base. Each request
+    # with changes moves the revision on by one. A malformed topology isn't kept
+    def SYNC(self, request):
+        topology = request["topology"]
+        with self.lock:
+            edited = self.edited.get(topology)
+            # starts from the time so a revision from before the server was restarted isn't taken for a current one
+            revision = edited.revision + 1 if edited else int(time.time() * 1000)
+            try:
+                self.edited[topology] = EditedTopology.checked(revision, request["nodes"], request["links"],
+                                                               request.get("settings", {}))
+            except EditError as e:
+                return {"error": "EditError: %s" % e}
+        return {"revision": revision}
+
+    # fill in the nodes, links and settings of a request sent as changes. Returns None, or what
+    # to send back if they can't be made and the client has to SYNC the whole topology again
+    def _edit_(self, request):
+        topology = request["topology"]
+        with self.lock:
+            edited = self.edited.get(topology)
+        if edited is None or edited.revision != request.pop("base"):
+            return {"resync": True, "revision": edited.revision if edited else None}
+        changes = request.pop("changes", None)
+        if changes:
+            try:
+                with metrics.stage("edit"):
+                    edited = edited.apply(changes)
+            except (EditError, KeyError, TypeError) as e:
+                return {"resync": True, "revision": edited.revision, "error": "%s: %s" % (type(e).__name__, e)}
+            with self.lock:
+                self.edited[topology] = edited
+        request["nodes"] = edited.nodes
+        request["links"] = edited.links
+        request["settings"] = edited.settings
+        # so the routers are only connected once for each revision
+        request["revision"] = ("edited", edited.revision)
+        return None
 
     def ANSIBLE_INSTALLED(self, request):
         if self.verbose:
-            print ("Ansible is", "installed") if find_executable("ansible") else "not installed"
-        return "installed" if find_executable("ansible") else ""
+            print ("Ansible is", "installed") if which("ansible") else "not installed"
+        return "installed" if which("ansible") else ""
 
     # if the node has listeners, and one of them has an http:'true'
     def has_console(self, node):
@@ -126,19 +186,42 @@ class Manager(object):
 
         listeners = node.get('listeners')
         if listeners:
-            for k, listener in listeners.iteritems():
+            for k, listener in listeners.items():
                 if listener.get('http'):
                     return True
 
         return False
 
     def DEPLOY(self, request):
+        # a second deployment would overwrite the state and output of the running one
+        with self.lock:
+            if self.state == "DEPLOYING":
+                return "deployment already in progress"
+            self.state = "DEPLOYING"
+
+        try:
+            conflicts = self._deploy_(request)
+        except Exception:
+            with self.lock:
+                self.state = None
+            raise
+
+        if conflicts:
+            with self.lock:
+                self.state = None
+            return {"conflicts": conflicts}
+        return "deployment started"
+
+    # returns what stopped the deployment from starting, if anything
+    def _deploy_(self, request):
         nodes = request["nodes"]
         topology = request["topology"]
-        inventory_file = self.deploy_base + "inventory.yml"
+        inventory_base = self.deploy_base + "inventory"
         ansible_become_pass = "ansible_become_pass"
 
-        self.PUBLISH(request, deploy=True)
+        published = self.PUBLISH(request, deploy=True)
+        if "conflicts" in published:
+            return published["conflicts"]
 
         inventory = {'deploy_routers':
              {'vars': {'topology': topology},
@@ -155,357 +238,809 @@ class Manager(object):
                 # if any of the nodes for this host has a console, set create_console for this host to true
                 hosts[host]['create_console'] = (hosts[host]['create_console'] or self.has_console(node))
                 hosts[host]['nodes'].append(node['name'])
-                # pass in the password for eash host if provided
-                if request.get(ansible_become_pass + "_" + host):
-                    hosts[host][ansible_become_pass] = request.get(ansible_become_pass + "_" + host)
-                # local hosts need to be marked as such
-                if host in ('0.0.0.0', 'localhost', '127.0.0.1'):
-                    hosts[host]['ansible_connection'] = 'local'
-
-        with open(inventory_file, 'w') as n:
-            yaml.safe_dump(inventory, n, default_flow_style=False)
-
-        # start ansible-playbook in separate thread so we don't have to wait and can still get a callback when done
-        def popenCallback(callback, args):
-            def popen(callback, args):
-                # send all output to deploy.txt so we can send it to the console in DEPLOY_STATUS
-                with open(self.deploy_file, 'w') as fout:
-                    proc = subprocess.Popen(args, stdout=fout, stderr=fout)
-                    proc.wait()
-                    callback(proc.returncode)
-                return
-            thread = threading.Thread(target=popen, args=(callback, args))
-            thread.start()
-
-        def ansible_done(returncode):
-            os.remove(inventory_file)
+        # hosts the topology's routers were deployed to before that have none of them now,
+        # so the routers left there are stopped
+        for host, had in self.artifacts.deployed(topology).items():
+            if host not in hosts and had.get("routers"):
+                hosts[host] = {'nodes': [], 'create_console': False}
+        for host in hosts:
+            # pass in the password for eash host if provided
+            if request.get(ansible_become_pass + "_" + host):
+                hosts[host][ansible_become_pass] = request.get(ansible_become_pass + "_" + host)
+            # local hosts need to be marked as such
+            if host in localHosts:
+                hosts[host]['ansible_connection'] = 'local'
+
+        with metrics.stage("artifacts"):
+            staged, unchanged = self._stage_(topology, hosts, request.get("force"))
+        if staged is None:
+            return ["the console to install is not in " + self.console_dir]
+
+        def ansible_done(state):
             if self.verbose:
-                print ("-------------- DEPLOYMENT DONE with return code", returncode, "------------")
-            if returncode:
-                self.state = returncode
-            else:
-                self.state = "DONE"
-
-        self.state = "DEPLOYING"
-        popenCallback(ansible_done, ['ansible-playbook', self.deploy_base + 'install_dispatch.yaml', '-i', inventory_file])
-
-        return "deployment started"
-
+                print ("-------------- DEPLOYMENT DONE with return code", state, "------------")
+            try:
+                # the hosts that failed are deployed again next time
+                status = self.deployer.status()
+                self.artifacts.record(topology, dict((h, staged[h]) for h in staged if status[h]['state'] == "DONE"))
+            finally:
+                with self.lock:
+                    self.state = state
+                self.deploy_log.finish()
+
+        self.deployer.start(self.deploy_base + 'install_dispatch.yaml', inventory, inventory_base, ansible_done, unchanged)
+
+    # stage the console and each router's config, and take the hosts that already have what
+    # they would be sent out of hosts. Of the others, only the routers whose config changed are
+    # copied and restarted. Returns what each remaining host is deployed with, by host, and
+    # the hosts taken out. force deploys everything
+    def _stage_(self, topology, hosts, force=False):
+        console = None
+        if any(h['create_console'] for h in hosts.values()):
+            if not os.path.isdir(self.console_dir):
+                return None, []
+            console = self.artifacts.console(self.console_dir)
+        previous = self.artifacts.deployed(topology)
+        deployed = {} if force else previous
+        tdir = self.topo_base + topology + "/"
+        staged = {}
+        unchanged = []
+        keep = [console[1]] if console else []
+        for host, h in list(hosts.items()):
+            paths = {}
+            routers = {}
+            for name in h['nodes']:
+                with open(tdir + name + ".conf") as fin:
+                    routers[name], paths[name] = self.artifacts.config(fin.read())
+            keep.extend(paths.values())
+            want = {"routers": routers, "console": console[0] if h['create_console'] else None}
+            want["hash"] = hashlib.sha1(json.dumps(want, sort_keys=True).encode('utf-8')).hexdigest()
+            had = deployed.get(host, {})
+            if had.get("hash") == want["hash"]:
+                unchanged.append(host)
+                del hosts[host]
+                continue
+            staged[host] = want
+            had_routers = had.get("routers", {})
+            h['nodes'] = [name for name in h['nodes'] if had_routers.get(name) != routers[name]]
+            h['configs'] = dict((name, paths[name]) for name in h['nodes'])
+            # routers that were deployed there before but aren't in the topology any more
+            h['retired'] = sorted(name for name in previous.get(host, {}).get("routers", {}) if name not in routers)
+            h['create_console'] = bool(want["console"]) and had.get("console") != want["console"]
+            if h['create_console']:
+                h['console_bundle'] = console[1]
+        self.artifacts.prune(keep)
+        return staged, unchanged
+
+    # start the routers of a topology on this host and return how long each took to be ready
+    def LAUNCH(self, request):
+        topology = request["topology"]
+        if self._store_(topology):
+            # the routers read the .conf files
+            self.EXPORT(request)
+        if self.verbose:
+            print ("LAUNCHing " + topology)
+        with metrics.stage("launch"):
+            return self._launcher_().start(self.topo_base + topology + "/")
+
+    def LAUNCH_STATUS(self, request):
+        return self._launcher_().status(self.topo_base + request["topology"] + "/")
+
+    # stop the routers LAUNCH started
+    def TEARDOWN(self, request):
+        return {"stopped": self._launcher_().stop(self.topo_base + request["topology"] + "/")}
+
+    def _launcher_(self):
+        with self.lock:
+            if self.launcher is None:
+                from mock.launch import Launcher
+                self.launcher = Launcher()
+            return self.launcher
+
+    # returns [output, state, next offset, per host results]. If the request has
+    # an offset only the output after it is returned, otherwise all of it
     def DEPLOY_STATUS(self, request):
-        with open(self.deploy_file, 'r') as fin:
-            content = fin.readlines()
+        offset = request.get('offset')
+        content, next_offset = self.deploy_log.read(int(offset or 0))
 
         # remove leading blank line
-        if len(content) > 1 and content[0] == '\n':
-            content.pop(0)
+        if offset is None and content.startswith('\n'):
+            content = content[1:]
 
-        return [''.join(content), self.state]
+        return [content, self.state, next_offset, self.deployer.status()]
+
+    def GET_CACHE_STATS(self, request):
+        return config_cache.stats()
 
     def GET_LOG(self, request):
         return []
 
+    # schema.json is sent as is, so there's no need to decode and re-encode it
     def GET_SCHEMA(self, request):
-        with open("schema.json") as fp:
-            data = json.load(fp)
-            return data
-
+        return self.schema_file.get()
+
+    # optional request fields:
+    #   summary: only return each node's name, type and host, not its sections
+    #   host, name: only return nodes on that host / with a name matching that glob pattern
+    #   offset, limit: return a page of the (filtered) nodes
+    # links are only returned if both of their nodes are. Use GET_NODE for a node's sections
+    # a watched topology is served from its live index and the response includes the
+    # index's revision, which can be passed to /topology-stream
     def LOAD(self, request):
         topology = request["topology"]
-        nodes = []
-        links = []
-
-        dc = DirectoryConfigs('./' + self.topo_base + topology + '/')
-        configs = dc.configs
-
-        port_map = []
-        for index, file in enumerate(configs):
-            port_map.append({'connectors': [], 'listeners': []})
-            node = {}
-            for sect in configs[file]:
-                # remove notes to self
-                #pdb.set_trace()
-                host = sect[1].get('deploy_host', None)
-                if host:
-                    del sect[1]['deploy_host']
-                #host = sect[1].pop('deploy_host', None)
-                section = dc.asSection(sect)
-                if section:
-                    if section.type == "router":
-                        node["index"] = index
-                        node["nodeType"] = "edge" if section.entries["mode"] == "edge" else str("inter-router")
-                        node["name"] = section.entries["id"]
-                        node["key"] = "amqp:/_topo/0/" + node["name"] + "/$management"
-                        if host:
-                            node['host'] = host
-                        nodes.append(node)
-
-                    elif section.type in sectionKeys:
-                        role = section.entries.get('role')
-                        if role == 'inter-router' or role == "edge":
-                            # we are processing an inter-router listener or connector: so create a link
-                            port = section.entries.get('port', 'amqp')
-                            if section.type == 'listener':
-                                port_map[index]['listeners'].append(port)
-                            else:
-                                port_map[index]['connectors'].append(port)
+        summary = request.get("summary", False)
+
+        live = self.live
+        if live is not None and live.name == topology:
+            topo = live.topology(summary)
+        else:
+            live = None
+            store = self._store_(topology)
+            if store:
+                configs = store.sections()
+            else:
+                configs = list(DirectoryConfigs('./' + self.topo_base + topology + '/').configs.values())
+
+            # nodes are kept by file index so the links can refer to them
+            port_map = []
+            nodes = []
+            for index, sections in enumerate(configs):
+                port_map.append({'connectors': [], 'listeners': [], 'host': None})
+                nodes.append(self._node_(index, sections, port_map[index], summary))
+
+            with metrics.stage("links"):
+                sources, targets = self._links_(port_map)
+            topo = Topology(nodes, sources, targets)
+
+        found = [n for n in topo.nodes if n]
+        nodes, links = self._filter_(request, topo, found)
+        result = {"nodes": [n.as_dict() for n in nodes], "links": links, "topology": topology, "total": len(found)}
+        if live is not None:
+            result["revision"] = live.revision
+        return result
+
+    # return all the details of one node of a topology given its index or name
+    def GET_NODE(self, request):
+        store = self._store_(request["topology"])
+        if store:
+            return self._store_node_(store, request)
+        tdir = './' + self.topo_base + request["topology"] + '/'
+        files = glob(tdir + '*.conf')
+        index = request.get("index")
+        if index is None:
+            name = request["name"]
+            # PUBLISH names the files after the routers, so try that first
+            if tdir + name + '.conf' in files:
+                index = files.index(tdir + name + '.conf')
+            else:
+                for i, file in enumerate(files):
+                    if any(sect[0] == 'router' and sect[1].get('id') == name for sect in config_cache.get(file)):
+                        index = i
+                        break
+                if index is None:
+                    return "Node " + name + " not found"
+        if index < 0 or index >= len(files):
+            return "Node index out of range"
+
+        ports = {'connectors': [], 'listeners': [], 'host': None}
+        node = self._node_(index, config_cache.get(files[index]), ports)
+        return node.as_dict() if node else None
+
+    def _store_node_(self, store, request):
+        index = request.get("index")
+        if index is None:
+            found = store.get(name=request["name"])
+            if found is None:
+                # the router may not be named after its config
+                for position, sections in enumerate(store.sections()):
+                    if any(sect[0] == 'router' and sect[1].get('id') == request["name"] for sect in sections):
+                        found = (position, sections)
+                        break
+                else:
+                    return "Node " + request["name"] + " not found"
+        else:
+            found = store.get(position=index)
+            if found is None:
+                return "Node index out of range"
+
+        ports = {'connectors': [], 'listeners': [], 'host': None}
+        node = self._node_(found[0], found[1], ports)
+        return node.as_dict() if node else None
+
+    # the store for a topology if topologies are kept in stores. A topology that is still
+    # a directory of .conf files, or no directory at all, is read the way it would be without
+    # a store. Its .conf files are moved into the store the first time it is written, so
+    # reads never create anything on disk
+    def _store_(self, topology, write=False):
+        if self.store != "sqlite":
+            return None
+        tdir = self.topo_base + topology + '/'
+        from mock.store import TopologyStore
+        store = TopologyStore(tdir)
+        if not store.exists():
+            if not write:
+                return None
+            configs = {}
+            for f in glob(tdir + '*.conf'):
+                with open(f) as fin:
+                    configs[os.path.basename(f)[:-len(".conf")]] = fin.read()
+            store.write(configs)
+        return store
+
+    # write the .conf files qdrouterd needs for a topology that is kept in a store
+    def EXPORT(self, request):
+        store = self._store_(request["topology"])
+        if store is None:
+            return "Topologies are kept as .conf files"
+        with metrics.stage("file_io"):
+            return self._write_configs_(self.topo_base + request["topology"] + "/",
+                                        dict((name + ".conf", config) for name, config in store.configs().items()))
+
+    # turn the sections from one config file into a Node. inter-router and edge listeners
+    # and connectors are added to ports so they can be made into links
+    def _node_(self, index, sections, ports, summary=False):
+        router = None
+        host = None
+        others = []
+        for sect in sections:
+            # remove notes to self
+            deploy_host = sect[1].pop('deploy_host', None)
+            if summary and sect[0] != 'router' and sect[1].get('role') not in ('inter-router', 'edge'):
+                continue
+            section = DirectoryConfigs.asSection(sect)
+            if section:
+                if section.type == "router":
+                    router = section
+                    host = deploy_host
+                    if host:
+                        ports['host'] = host
+
+                elif section.type in sectionKeys:
+                    role = section.entries.get('role')
+                    if role == 'inter-router' or role == "edge":
+                        # we are processing an inter-router listener or connector: so create a link
+                        endpoint = (section.entries.get('host'), section.entries.get('port', 'amqp'))
+                        if section.type == 'listener':
+                            ports['listeners'].append(endpoint)
                         else:
-                            if section.type+'s' not in node:
-                                node[section.type+'s'] = {}
-                            key = sectionKeys[section.type]
-                            if '|' in key:
-                                # assumes at least one of the keys will have a value
-                                val = [section.entries.get(x) for x in key.split('|') if section.entries.get(x)][0]
-                            else:
-                                val = section.entries.get(key)
-                            node[section.type+'s'][val] = section.entries
-
-        for source, ports_for_this_routers in enumerate(port_map):
-            for listener_port in ports_for_this_routers['listeners']:
-                for target, ports_for_other_routers in enumerate(port_map):
-                    if listener_port in ports_for_other_routers['connectors']:
-                        links.append({'source': source, 'target': target, 'dir': str("in")})
-
-        return {"nodes": nodes, "links": links, "topology": topology}
+                            ports['connectors'].append(endpoint)
+                    else:
+                        others.append(section)
+        if router is None:
+            return None
+
+        node = Node(index, router.entries["id"], "edge" if router.entries["mode"] == "edge" else "inter-router", host or None)
+        for section in others:
+            key = sectionKeys[section.type]
+            if '|' in key:
+                # assumes at least one of the keys will have a value
+                val = [section.entries.get(x) for x in key.split('|') if section.entries.get(x)][0]
+            else:
+                val = section.entries.get(key)
+            node.add_section(section.type + 's', val, section.entries)
+        return node
+
+    def _filter_(self, request, topology, nodes):
+        host = request.get("host")
+        pattern = request.get("name")
+        offset = int(request.get("offset", 0))
+        limit = request.get("limit")
+        if host is None and pattern is None and not offset and limit is None:
+            return nodes, topology.links()
+
+        if host is not None:
+            nodes = [n for n in nodes if n.host == host]
+        if pattern is not None:
+            nodes = [n for n in nodes if fnmatchcase(n.name, pattern)]
+        nodes = nodes[offset:] if limit is None else nodes[offset:offset + int(limit)]
+        included = set(n.index for n in nodes)
+        numbers = [l for n in nodes for l in topology.outgoing(n.index) if topology.targets[l] in included]
+        return nodes, topology.links(numbers)
+
+    # match inter-router/edge connectors to the listeners they connect to.
+    # returns the source and target node of each link
+    def _links_(self, port_map):
+        # index every listener by (host, port) and by port alone
+        listeners = []
+        by_endpoint = {}
+        by_port = {}
+        for source, ports in enumerate(port_map):
+            for host, port in ports['listeners']:
+                key = resolve(host, ports['host'], port)
+                by_endpoint.setdefault(key, []).append(len(listeners))
+                by_port.setdefault(port, []).append(len(listeners))
+                listeners.append((source, []))
+
+        # find the listener(s) for each connector. Fall back to matching on the port
+        # alone when the connector's host isn't known, but only if that port is unique
+        for target, ports in enumerate(port_map):
+            for host, port in ports['connectors']:
+                matches = by_endpoint.get(resolve(host, ports['host'], port))
+                if matches is None:
+                    matches = by_port.get(port)
+                    if matches is None or len(matches) > 1:
+                        continue
+                for l in matches:
+                    targets = listeners[l][1]
+                    if not targets or targets[-1] != target:
+                        targets.append(target)
+
+        sources = []
+        targets = []
+        for source, listener_targets in listeners:
+            for target in listener_targets:
+                sources.append(source)
+                targets.append(target)
+        return sources, targets
 
     def GET_TOPOLOGY(self, request):
         if self.verbose:
-            pprint (self.topology)
+            print (self.topology)
         return str(self.topology)
 
     def GET_TOPOLOGY_LIST(self, request):
         return [str(f) for f in os.listdir(self.topo_base) if os.path.isdir(self.topo_base + f)]
 
     def SWITCH(self, request):
-        self.topology = request["topology"]
-        tdir = './' + self.topo_base + self.topology + '/'
+        with self.lock:
+            self.topology = request["topology"]
+        tdir = './' + self.topo_base + request["topology"] + '/'
         if not os.path.exists(tdir):
             os.makedirs(tdir)
+        if self.watch is not None:
+            self._watch_(request["topology"])
         return self.LOAD(request)
 
+    # index a topology and keep the index up to date as its files change
+    def _watch_(self, topology):
+        from mock.live import LiveIndex
+        from mock.watch import Watcher
+        live = LiveIndex(topology, self.topo_base + topology + '/', self._live_node_)
+        watcher = Watcher(live.path, live.refresh, **self.watch)
+        # start watching before reading everything so no change is missed
+        watcher.start()
+        live.refresh(None)
+        if self.verbose:
+            print ("watching", live.path, "using", watcher.method)
+        with self.lock:
+            old = (self.live, self.watcher)
+            self.live = live
+            self.watcher = watcher
+        if old[1]:
+            old[1].stop()
+            old[0].close()
+
+    def _live_node_(self, path, ports):
+        return self._node_(-1, config_cache.get(path), ports)
+
+    # show the config file a node would have, or without nodes the config
+    # that was last published for the router with the given name
     def SHOW_CONFIG(self, request):
-        nodeIndex = request['nodeIndex']
-        return self.PUBLISH(request, nodeIndex)
-
-    def _connect_(self, links, nodes, default_host, listen_port):
-        for link in links:
-            s = nodes[link['source']]
-            t = nodes[link['target']]
-            # keep track of names so we can print them above the sections
-            if 'ilisten_from' not in s:
-                s['ilisten_from'] = []
-            if 'iconn_to' not in t:
-                t['iconn_to'] = []
-            if 'iconns' not in t:
-                t['iconns'] = []
-            if 'elisten_from' not in s:
-                s['elisten_from'] = []
-            if 'econn_to' not in t:
-                t['econn_to'] = []
-            if 'econns' not in t:
-                t['econns'] = []
-
-            # make sure source node has a listener
-            lport = listen_port
-            lhost = s.get('host', default_host)
-            if s['nodeType'] == 'edge' or t['nodeType'] == 'edge':
-                s['elisten_from'].append(t['name'])
-                if 'elistener' not in s:
-                    s['elistener'] = listen_port
-                    listen_port += 1
-                else:
-                    lport = s['elistener']
-
-                t['econns'].append({"port": lport, "host": lhost})
-                t['econn_to'].append(s['name'])
-            else:
-                s['ilisten_from'].append(t['name'])
-                if 'ilistener' not in s:
-                    s['ilistener'] = listen_port
-                    listen_port += 1
-                else:
-                    lport = s['ilistener']
-
-                t['iconns'].append({"port": lport, "host": lhost})
-                t['iconn_to'].append(s['name'])
-
-    def PUBLISH(self, request, nodeIndex=None, deploy=False):
+        if "nodes" not in request:
+            store = self._store_(request["topology"])
+            if store:
+                return store.config(request["name"]) or "Node " + request["name"] + " not found"
+            path = self.topo_base + request["topology"] + "/" + os.path.basename(request["name"]) + ".conf"
+            if not os.path.exists(path):
+                return "Node " + request["name"] + " not found"
+            with open(path) as fin:
+                return fin.read()
+        return self._configs_(request, [request['nodeIndex']])[0]
+
+    # return the config files of the nodes with the given indexes, in the same order
+    def SHOW_CONFIGS(self, request):
+        return self._configs_(request, request['nodeIndexes'])
+
+    def _configs_(self, request, indexes):
+        settings = request["settings"]
+        http_port = int(settings.get('http_port', 5675))
+        topo, plans, positions, conflicts = self._plan_(request)
+
+        configs = []
+        for nodeIndex in indexes:
+            if nodeIndex and nodeIndex >= len(topo.nodes):
+                configs.append("Node index out of range")
+                continue
+            position = positions.get(nodeIndex)
+            if position is None:
+                configs.append("published")
+                continue
+            # only the sections of the nodes being shown are needed
+            node = Node.from_dict(request["nodes"][position])
+            if self.verbose:
+                print ("Creating config for " + request["topology"] + " node " + node.name)
+            with metrics.stage("render"):
+                configs.append(self._render_(node, plans[position], nodeIndex, http_port, False))
+        return configs
+
+    # return the listeners and connectors each node needs for its links
+    def _connect_(self, topology, default_host, listen_port, ports=None, previous=None):
+        return connect(topology, default_host, listen_port, ports, previous)
+
+    # return the Topology of a request's nodes and links, without the nodes' sections, the
+    # Plan for each node, the position of the router with each index and the port conflicts.
+    # The last few are kept so showing the configs of one node after another or publishing
+    # what was just shown doesn't connect the routers again. They are keyed by the request's
+    # revision, which the client must change whenever it changes the nodes, links or listeners,
+    # or by a digest the client made of them. A request sent as changes has the revision of
+    # the edit. Without either the plans are made again, since finding out whether the request
+    # is the same as an earlier one would cost as much as reading all of it
+    def _plan_(self, request):
+        topology = request["topology"]
         nodes = request["nodes"]
         links = request["links"]
-        topology = request["topology"]
         settings = request["settings"]
-        http_port = int(settings.get('http_port', 5675))
         listen_port = int(settings.get('internal_port', 2000))
+        http_port = int(settings.get('http_port', 5675))
         default_host = settings.get('default_host', '0.0.0.0')
-
-        if nodeIndex and nodeIndex >= len(nodes):
-            return "Node index out of range"
+        generation, previous = self._assigned_(topology)
+        key = None
+        if request.get("revision") is not None:
+            key = (topology, hashable(default_host), listen_port, http_port, generation, "revision", hashable(request["revision"]))
+        elif request.get("digest") is not None:
+            key = (topology, hashable(default_host), listen_port, http_port, generation, "digest", hashable(request["digest"]))
+        if key is not None:
+            with self.lock:
+                plan = self.plans.get(key)
+                if plan is not None:
+                    self.plans.move_to_end(key)
+                    return plan
+
+        topo = Topology.from_request(nodes, links, False)
+        with metrics.stage("links"):
+            # the routers' own listeners and the console's port are kept clear of
+            ports = Ports.from_request(nodes, [http_port])
+            plans = self._connect_(topo, default_host, listen_port, ports, previous)
+        positions = {}
+        for position, node in enumerate(topo.nodes):
+            if node.cls == 'router' and node.index not in positions:
+                positions[node.index] = position
+        plan = (topo, plans, positions, ports.conflicts)
+        if key is not None:
+            with self.lock:
+                self.plans[key] = plan
+                while len(self.plans) > self.plan_cache_size:
+                    self.plans.popitem(last=False)
+        return plan
+
+    # return (generation, ports) where ports is the listener port of each router by (name,
+    # role) when the topology was last published. generation changes whenever they do
+    def _assigned_(self, topology):
+        with self.lock:
+            assigned = self.assigned.get(topology)
+        if assigned is None:
+            ports = {}
+            tdir = self.topo_base + topology + '/'
+            if os.path.isdir(tdir):
+                store = self._store_(topology)
+                for sections in (store.sections() if store else DirectoryConfigs('./' + tdir).configs.values()):
+                    name = None
+                    for sect in sections:
+                        if sect[0] == 'router':
+                            name = sect[1].get('id')
+                        elif sect[0] == 'listener' and sect[1].get('role') in ('inter-router', 'edge'):
+                            try:
+                                ports[(name, sect[1]['role'])] = int(sect[1].get('port'))
+                            except (TypeError, ValueError):
+                                pass
+            with self.lock:
+                assigned = self.assigned.setdefault(topology, (0, ports))
+        return assigned
+
+    # keep the ports a PUBLISH gave the listeners so the next one can give them the same ones
+    def _remember_ports_(self, topology, topo, plans):
+        ports = {}
+        for node, plan in zip(topo.nodes, plans):
+            if plan.ilistener is not None:
+                ports[(node.name, 'inter-router')] = plan.ilistener
+            if plan.elistener is not None:
+                ports[(node.name, 'edge')] = plan.elistener
+        with self.lock:
+            generation, previous = self.assigned.get(topology, (0, None))
+            if ports != previous:
+                self.assigned[topology] = (generation + 1, ports)
+
+    def PUBLISH(self, request, deploy=False):
+        topology = request["topology"]
+        settings = request["settings"]
+        http_port = int(settings.get('http_port', 5675))
 
         if self.verbose:
-            if nodeIndex is not None:
-                print ("Creating config for " + topology + " node " + nodes[nodeIndex]['name'])
-            elif deploy:
+            if deploy:
                 print("DEPLOYing to " + topology)
             else:
                 print("PUBLISHing to " + topology)
 
+        # establish connections and listeners for each node based on links
+        topo, plans, positions, conflicts = self._plan_(request)
+        if conflicts:
+            # nothing is written until the routers could all start
+            return {"conflicts": conflicts}
+
+        # now process all the routers
+        rendered = {}
+        for position, (node, plan) in enumerate(zip(topo.nodes, plans)):
+            if node.cls == 'router':
+                node = Node.from_dict(request["nodes"][position])
+                if self.verbose:
+                    print ("------------- processing node", node.name, "---------------")
+
+                with metrics.stage("render"):
+                    rendered[node.name + ".conf"] = self._render_(node, plan, None, http_port, deploy)
+
+        store = self._store_(topology, write=True)
+        if store:
+            with metrics.stage("store"):
+                summary = store.write(dict((name[:-len(".conf")], config) for name, config in rendered.items()))
+            # ansible deploys the .conf files
+            if deploy:
+                self.EXPORT(request)
+        else:
+            with metrics.stage("file_io"):
+                summary = self._write_configs_(self.topo_base + topology + "/", rendered)
+            live = self.live
+            if live is not None and live.name == topology:
+                # so the next LOAD sees what was written without waiting for the watcher
+                live.refresh([n + ".conf" for state in ("added", "changed", "removed") for n in summary[state]], "publish")
+        self._remember_ports_(topology, topo, plans)
+        return summary
+
+    # return the config file for one router
+    def _render_(self, node, plan, nodeIndex, http_port, deploy):
+        # the sections are appended to out and joined once when the node is done
+        out = []
+
+        # add a router section in the config file
+        attributes = dict(node.router)
+        attributes.pop('id', None)
+        r = RouterSection(node.name, **attributes)
         if nodeIndex is None:
-            # remove all .conf files from the output dir. they will be recreated below possibly under new names
-            for f in glob(self.topo_base + topology + "/*.conf"):
+            r.setEntry('deploy_host', node.host or '')
+        if not plan.linked():
+            r.setEntry('mode', 'standalone')
+        elif node.nodeType == 'edge':
+            r.setEntry('mode', 'edge')
+        else: 
+            r.setEntry('mode', 'interior')
+        r.render(out)
+        out.append("\n")
+
+        # write other sections
+        for sectionKey in sectionKeys:
+            if sectionKey+'s' in node.sections:
+                if self.verbose:
+                    print ("found", sectionKey+'s')
+                cname = sectionKey[0].upper() + sectionKey[1:] + "Section"
+                c = get_class(cname)
+                for k, entries in node.sections[sectionKey+'s'].items():
+                    if self.verbose:
+                        print ("processing", k)
+                    o = dict(entries)
+                    if sectionKey == "listener" and o['port'] != 'amqp' and int(o['port']) == http_port:
+                        out.append("\n# Listener for a console\n")
+                        if deploy:
+                            o['httpRoot'] = '/usr/local/share/qpid-dispatch/stand-alone'
+                    if node.host == o.get('host'):
+                        o['host'] = '0.0.0.0'
+                    if self.verbose:
+                        print ("attributes", o, "is written as", str(c(**o)))
+                    c(**o).render(out)
+                    out.append("\n")
+
+        lhost = "0.0.0.0"
+        for port, role, listen_from in ((plan.ilistener, 'inter-router', plan.ilisten_from),
+                                        (plan.elistener, 'edge', plan.elisten_from)):
+            if port is not None:
+                if listen_from:
+                    out.append("\n# listener for connectors from " + ', '.join(listen_from) + "\n")
+                ListenerSection(port, **{'host': lhost, 'role': role}).render(out)
+                out.append("\n")
+
+        for conns, role in ((plan.iconns, 'inter-router'), (plan.econns, 'edge')):
+            for conn_port, conn_host, name in conns:
+                if node.host == conn_host:
+                    conn_host = "0.0.0.0"
+                out.append("\n# connect to " + name + "\n")
+                ConnectorSection(conn_port, **{'host': conn_host, 'role': role}).render(out)
+                out.append("\n")
+
+        return ''.join(out)
+
+    # only write the config files whose content changed and remove the ones for deleted nodes
+    def _write_configs_(self, tdir, rendered):
+        summary = {"added": [], "changed": [], "removed": [], "unchanged": []}
+        for f in glob(tdir + "*.conf"):
+            fname = os.path.basename(f)
+            if fname not in rendered:
                 if self.verbose:
                     print ("Removing", f)
                 os.remove(f)
+                self.digests.pop(f, None)
+                summary["removed"].append(fname[:-len(".conf")])
 
-        # establish connections and listeners for each node based on links
-        self._connect_(links, nodes, default_host, listen_port)
+        for fname in rendered:
+            path = tdir + fname
+            data = rendered[fname].encode('utf-8')
+            digest = hashlib.sha1(data).hexdigest()
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+
+            if st is None:
+                state = "added"
+            elif st.st_size != len(data):
+                state = "changed"
+            else:
+                # the hash of what we last wrote is good as long as the file hasn't been touched since
+                known = self.digests.get(path)
+                if known and known[0] == (st.st_mtime_ns, st.st_size):
+                    current = known[1]
+                else:
+                    with open(path, 'rb') as fin:
+                        current = hashlib.sha1(fin.read()).hexdigest()
+                state = "unchanged" if current == digest else "changed"
 
-        # now process all the routers
-        for node in nodes:
-            if node['cls'] == 'router':
+            if state != "unchanged":
                 if self.verbose:
-                    print ("------------- processing node", node["name"], "---------------")
-
-                nname = node["name"]
-                if nodeIndex is not None:
-                    config_fp = io.StringIO()
-                else:
-                    config_fp = open(self.topo_base + topology + "/" + nname + ".conf", "w+")
-
-                # add a router section in the config file
-                r = RouterSection(**node)
-                if nodeIndex is None:
-                    r.setEntry('deploy_host', node.get('host', ''))
-                if not node.get('iconns') and not node.get('ilistener') and not node.get('econns') and not node.get('elistener'):
-                    r.setEntry('mode', 'standalone')
-                elif node['nodeType'] == 'edge':
-                    r.setEntry('mode', 'edge')
-                else: 
-                    r.setEntry('mode', 'interior')
-                r.setEntry('id', node['name'])
-                config_fp.write(str(r) + "\n")
-
-                # write other sections
-                for sectionKey in sectionKeys:
-                    if sectionKey+'s' in node:
-                        if self.verbose:
-                            print ("found", sectionKey+'s')
-                        for k in node[sectionKey+'s']:
-                            if self.verbose:
-                                print ("processing", k)
-                            o = node[sectionKey+'s'][k]
-                            cname = sectionKey[0].upper() + sectionKey[1:] + "Section"
-                            if self.verbose:
-                                print ("class name is", cname)
-                            c = get_class(cname)
-                            if sectionKey == "listener" and o['port'] != 'amqp' and int(o['port']) == http_port:
-                                config_fp.write("\n# Listener for a console\n")
-                                if deploy:
-                                    o['httpRoot'] = '/usr/local/share/qpid-dispatch/stand-alone'
-                            if node.get('host') == o.get('host'):
-                                o['host'] = '0.0.0.0'
-                            if self.verbose:
-                                print ("attributes", o, "is written as", str(c(**o)))
-                            config_fp.write(str(c(**o)) + "\n")
-
-                lhost = "0.0.0.0"
-                if 'ilistener' in node:
-                    listenerSection = ListenerSection(node['ilistener'], **{'host': lhost, 'role': 'inter-router'})
-                    if 'ilisten_from' in node and len(node['ilisten_from']) > 0:
-                        config_fp.write("\n# listener for connectors from " + ', '.join(node['ilisten_from']) + "\n")
-                    config_fp.write(str(listenerSection) + "\n")
-                if 'elistener' in node:
-                    listenerSection = ListenerSection(node['elistener'], **{'host': lhost, 'role': 'edge'})
-                    if 'elisten_from' in node and len(node['elisten_from']) > 0:
-                        config_fp.write("\n# listener for connectors from " + ', '.join(node['elisten_from']) + "\n")
-                    config_fp.write(str(listenerSection) + "\n")
-
-                if 'iconns' in node:
-                    for idx, conns in enumerate(node['iconns']):
-                        conn_port = conns['port']
-                        conn_host = conns['host']
-                        if node.get('host') == conn_host:
-                            conn_host = "0.0.0.0"
-                        connectorSection = ConnectorSection(conn_port, **{'host': conn_host, 'role': 'inter-router'})
-                        if 'iconn_to' in node and len(node['iconn_to']) > idx:
-                            config_fp.write("\n# connect to " + node['iconn_to'][idx] + "\n")
-                        config_fp.write(str(connectorSection) + "\n")
-                if 'econns' in node:
-                    for idx, conns in enumerate(node['econns']):
-                        conn_port = conns['port']
-                        conn_host = conns['host']
-                        if node.get('host') == conn_host:
-                            conn_host = "0.0.0.0"
-                        connectorSection = ConnectorSection(conn_port, **{'host': conn_host, 'role': 'edge'})
-                        if 'econn_to' in node and len(node['econn_to']) > idx:
-                            config_fp.write("\n# connect to " + node['econn_to'][idx] + "\n")
-                        config_fp.write(str(connectorSection) + "\n")
-
-                # return requested config file as string
-                if node.get('index', -1) == nodeIndex:
-                    val = config_fp.getvalue()
-                    config_fp.close()
-                    return val
-
-                config_fp.close()
-
-        return "published"
-
-class HttpHandler(http.server.SimpleHTTPRequestHandler):
-    # use GET requests to serve the web pages
-    def do_GET(self):
-        http.server.SimpleHTTPRequestHandler.do_GET(self);
-
-    def getheader(self, key, default):
-        headers = self.headers._headers
-        for (name, value) in headers:
-            if name == key:
-                return value
-        return default
-
-    # use POST requests to send commands
-    def do_POST(self):
-        content_len = int(self.headers.get("Content-Length"), 0)
-        if content_len > 0:
-            body = self.rfile.read(content_len)
-            self.log_message(str(body));
-            data = json.loads(body)
+                    print ("Writing", path)
+                fd, tmp = tempfile.mkstemp(dir=tdir, prefix="." + fname, suffix=".tmp")
+                with os.fdopen(fd, 'wb') as fout:
+                    fout.write(data)
+                # mkstemp creates the file as owner-only; keep the mode the file had before
+                os.chmod(tmp, stat.S_IMODE(st.st_mode) if st else 0o644)
+                os.replace(tmp, path)
+                st = os.stat(path)
+            self.digests[path] = ((st.st_mtime_ns, st.st_size), digest)
+            summary[state].append(fname[:-len(".conf")])
+
+        return summary
+
+
+
+# read a topology sent the way the console sends it from a JSON file, or - for stdin
+# a value from a request as part of a cache key. Lists and dicts are keyed by their JSON
+def hashable(value):
+    if isinstance(value, (str, int, float, tuple)) or value is None:
+        return value
+    return json.dumps(value, sort_keys=True)
+
+def read_request(path):
+    if path == '-':
+        return json.load(sys.stdin)
+    with open(path) as fin:
+        return json.load(fin)
+
+# run one of the commands that don't need the server. Returns the exit status
+def run_command(args, manager):
+    if args.command == "publish":
+        status = 0
+        for path in args.files:
+            request = read_request(path)
+            if "topology" not in request:
+                request["topology"] = os.path.splitext(os.path.basename(path))[0]
+            request.setdefault("settings", {})
+            os.makedirs(manager.topo_base + request["topology"], exist_ok=True)
+            summary = manager.operation("PUBLISH", request)
+            if "conflicts" in summary:
+                status = 1
+            print (json.dumps(dict(summary, topology=request["topology"])))
+        return status
+
+    if args.command == "load":
+        names = []
+        for pattern in args.names:
+            names.extend(sorted(os.path.basename(d[:-1]) for d in glob(manager.topo_base + pattern + '/')))
+        if not names:
+            print ("no topologies match " + ' '.join(args.names), file=sys.stderr)
+            return 1
+        for name in names:
+            topology = manager.operation("LOAD", {"topology": name, "summary": args.summary})
+            if args.output:
+                os.makedirs(args.output, exist_ok=True)
+                with open(os.path.join(args.output, name + ".json"), 'w') as fout:
+                    json.dump(topology, fout)
+            else:
+                print (json.dumps(topology))
+        return 0
+
+    if args.command == "render":
+        request = read_request(args.file)
+        request.setdefault("topology", os.path.splitext(os.path.basename(args.file))[0])
+        request.setdefault("settings", {})
+        for node in request["nodes"]:
+            if args.node in (node.get("name"), str(node.get("index"))):
+                sys.stdout.write(manager.operation("SHOW-CONFIG", dict(request, nodeIndex=node.get("index"))))
+                return 0
+        print ("node " + args.node + " not found", file=sys.stderr)
+        return 1
+
+    # batch: the requests the server would be sent, one per line, and a response line for each
+    status = 0
+    with (sys.stdin if args.file == '-' else open(args.file)) as fin:
+        for line in fin:
+            if not line.strip():
+                continue
+            request = json.loads(line)
             try:
-                response = self.server.manager.operation(data['operation'], data)
-                if response is not None:
-                    self.send_response(200)
-                    self.send_header('Content-Type', 'application/json')
-                    #self.send_header("Content-Length", len(response))
-                    self.end_headers()
-
-                    self.wfile.write(json.dumps(response).encode('utf-8'))
-                    self.wfile.flush();
-                    print (json.dumps(response).encode('utf-8'))
-                    #self.wfile.close()
-            except Exception:
-                self.send_error(500, traceback.format_exc())
-        else:
-            return self.do_POST()
-
-    # only log if verbose was requested
-    def log_request(self, code='-', size='-'):
-        if self.server.verbose:
-            self.log_message('"%s" %s %s', self.requestline, str(code), str(size))
-
-class ConfigTCPServer(socketserver.TCPServer):
-    def __init__(self, port, manager, verbose):
-        socketserver.TCPServer.__init__(self, ("", port), HttpHandler)
-        self.manager = manager
-        self.verbose = verbose
-
-Schema.init()
-parser = argparse.ArgumentParser(description='Read/Write Qpid Dispatch Router config files.')
-parser.add_argument('-p', "--port", type=int, default=8000, help='port to listen for requests from browser')
-parser.add_argument('-v', "--verbose", action='store_true', help='verbose output')
-parser.add_argument("-t", "--topology", default="config-2", help="which topology to load (default: %(default)s)")
-args = parser.parse_args()
-
-try:
-    httpd = ConfigTCPServer(args.port, Manager(args.topology, args.verbose), args.verbose)
-    print ("serving at port", args.port)
-    httpd.serve_forever()
-except KeyboardInterrupt:
-    pass
\ No newline at end of file
+                if not hasattr(manager, request["operation"].replace("-", "_")):
+                    raise NotImplementedError(request["operation"] + " is not implemented")
+                response = manager.operation(request["operation"], request)
+                if isinstance(response, PreparedResponse):
+                    response = json.loads(response.body)
+            except Exception as e:
+                response = {"error": "%s: %s" % (type(e).__name__, e)}
+                status = 1
+            print (json.dumps(response))
+    return status
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Read/Write Qpid Dispatch Router config files. Serves the console unless a command is given.')
+    parser.add_argument('-p', "--port", type=int, default=8000, help='port to listen for requests from browser')
+    parser.add_argument('-v', "--verbose", action='store_true', help='verbose output')
+    parser.add_argument("-t", "--topology", default="config-2", help="which topology to load (default: %(default)s)")
+    parser.add_argument('-w', "--workers", type=int, default=8, help="number of requests to handle at once (default: %(default)s)")
+    parser.add_argument("--deploy-parallel", type=int, default=4, help="max ansible-playbook processes to run at once when deploying (default: %(default)s)")
+    parser.add_argument("--deploy-batch", type=int, default=1, help="hosts per ansible-playbook process (default: %(default)s)")
+    parser.add_argument("--deploy-command", default="ansible-playbook",
+                        help="command DEPLOY runs for each batch, given the playbook and -i inventory (default: %(default)s)")
+    parser.add_argument("--cache-size", type=int, default=10000, help="max number of parsed config files to cache (default: %(default)s)")
+    parser.add_argument("--cache-file", help="file used to persist the parsed config cache between runs")
+    parser.add_argument("--static-cache-size", type=int, default=64, help="MB of console files to keep in memory (default: %(default)s)")
+    parser.add_argument("--read-threads", type=int, default=1, help="threads used to read config files that changed (default: %(default)s)")
+    parser.add_argument("--parse-processes", type=int, default=0, help="processes used to parse config files when many changed, 0 to parse in the server (default: %(default)s)")
+    parser.add_argument("--watch", action='store_true', help="keep the current topology indexed and follow edits to its files")
+    parser.add_argument("--watch-poll", type=float, metavar="SECONDS",
+                        help="look for edits every SECONDS instead of using inotify")
+    parser.add_argument("--router-command", default="qdrouterd", help="command LAUNCH runs for each router, given -c config (default: %(default)s)")
+    parser.add_argument("--launch-parallel", type=int, default=8, help="routers LAUNCH starts at once (default: %(default)s)")
+    parser.add_argument("--launch-timeout", type=float, default=30.0,
+                        help="seconds a launched router has to open its listener ports (default: %(default)s)")
+    parser.add_argument("--store", choices=["files", "sqlite"], default="files",
+                        help="keep each topology as a .conf file per router or in a single SQLite file (default: %(default)s)")
+    parser.add_argument("--topologies", default="topologies/", help="directory the topologies are kept in (default: %(default)s)")
+
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    publish = commands.add_parser("publish", help="write the configs of topologies saved from the console as JSON")
+    publish.add_argument("files", nargs='+', help="JSON files, or - for stdin. The topology is named after the file unless it has a name")
+    load = commands.add_parser("load", help="print topologies as JSON, one per line")
+    load.add_argument("names", nargs='+', metavar="topology", help="topology names or glob patterns")
+    load.add_argument('-o', "--output", help="write each topology to OUTPUT/<topology>.json instead")
+    load.add_argument("--summary", action='store_true', help="leave out the routers' sections")
+    render = commands.add_parser("render", help="print the config of one router of a topology saved as JSON")
+    render.add_argument("file", help="JSON file, or - for stdin")
+    render.add_argument("node", help="name or index of the router")
+    batch = commands.add_parser("batch", help="run requests like the ones the console sends, one JSON object per line")
+    batch.add_argument("file", nargs='?', default='-', help="file of requests (default: stdin)")
+
+    args = parser.parse_args()
+    if args.watch and args.store != "files":
+        parser.error("--watch follows the .conf files of a topology, so it needs --store files")
+    config_cache.configure(maxsize=args.cache_size, snapshot=args.cache_file,
+                           read_threads=args.read_threads, parse_processes=args.parse_processes)
+
+    if args.command:
+        manager = Manager(None, args.verbose, store=args.store,
+                          topo_base=os.path.join(os.path.relpath(args.topologies), ''))
+        sys.exit(run_command(args, manager))
+
+    from mock.launch import Launcher
+    from mock.server import ConfigTCPServer
+    Schema.init()
+    watch = None
+    if args.watch:
+        watch = {'polling': True, 'interval': args.watch_poll} if args.watch_poll else {}
+    try:
+        launcher = Launcher(args.router_command, args.launch_parallel, args.launch_timeout)
+        # the topology is watched as the manager is made, so it has to know where the topologies are
+        manager = Manager(args.topology, args.verbose, args.deploy_parallel, args.deploy_batch, watch, args.store, launcher,
+                          os.path.join(os.path.relpath(args.topologies), ''), args.deploy_command)
+        httpd = ConfigTCPServer(args.port, manager, args.verbose, args.workers, args.static_cache_size << 20)
+        print ("serving at port", args.port)
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
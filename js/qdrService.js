@@ -114,7 +114,8 @@ var QDR = (function (QDR) {
           return flat;
         },
         getSchema: function (callback) {
-          self.sendMethod("GET-SCHEMA", {}, function (response) {
+          // fetched with a GET so the browser can revalidate it using its ETag
+          $.getJSON("schema.json", function (response) {
             for (var entityName in response.entityTypes) {
               var entity = response.entityTypes[entityName];
               if (entity.deprecated) {
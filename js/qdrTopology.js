@@ -59,6 +59,10 @@ var QDR = (function (QDR) {
 
       $scope.Publish = function () {
         doOperation("PUBLISH", function (response) {
+          if (response && response.conflicts) {
+            showConflicts("published", response.conflicts);
+            return;
+          }
           Core.notification("info", $scope.mockTopologyDir + " published");
           QDR.log.info("published " + $scope.mockTopologyDir);
         });
@@ -73,11 +77,23 @@ var QDR = (function (QDR) {
         doOperation(
           "DEPLOY",
           function (response) {
+            if (response && response.conflicts) {
+              showConflicts("deployed", response.conflicts);
+              return;
+            }
             QDR.log.info("deployment " + $scope.mockTopologyDir + " started");
           },
           extra
         );
       };
+      // the server won't write configs whose listener ports clash
+      var showConflicts = function (action, conflicts) {
+        Core.notification(
+          "error",
+          $scope.mockTopologyDir + " was not " + action + ": " + conflicts.join("; ")
+        );
+        QDR.log.info(conflicts.join("\n"));
+      };
       $scope.Deploy = function () {
         // show the deploy dialog
         doDeployDialog(startDeploy);
@@ -93,6 +109,13 @@ var QDR = (function (QDR) {
         );
       };
       var doOperation = function (operation, callback, extraProps) {
+        // the server writes the configs from what it's sent, so it needs every section
+        if (Object.keys(summarized).length > 0) {
+          withDetails(nodes, function () {
+            doOperation(operation, callback, extraProps);
+          });
+          return;
+        }
         var l = [];
         links.forEach(function (link) {
           if (link.source.cls === "router" && link.target.cls === "router")
@@ -102,6 +125,51 @@ var QDR = (function (QDR) {
               cls: link.cls,
             });
         });
+        var current = snapshot(l);
+        var changes =
+          synced && synced.topology === current.topology
+            ? changesSince(synced, current)
+            : null;
+        if (changes === null) {
+          // the server doesn't have this topology, send all of it once
+          QDRService.sendMethod(
+            "SYNC",
+            { nodes: nodes, links: l, topology: current.topology, settings: settings },
+            function (response) {
+              current.revision = response.revision;
+              synced = current;
+              sendChanges(operation, callback, extraProps, current, [], l);
+            }
+          );
+          return;
+        }
+        sendChanges(operation, callback, extraProps, current, changes, l);
+      };
+      // send only what changed since the server's revision of the topology
+      var sendChanges = function (operation, callback, extraProps, current, changes, l) {
+        var props = {
+          topology: current.topology,
+          base: synced.revision,
+          changes: changes,
+        };
+        if (extraProps) Object.assign(props, props, extraProps);
+        QDRService.sendMethod(operation, props, function (response) {
+          if (response && response.resync) {
+            // someone else changed it, or the server was restarted. Send everything this time
+            synced = null;
+            sendAll(operation, callback, extraProps, l);
+            return;
+          }
+          if (changes.length > 0) {
+            current.revision = props.base + 1;
+            synced = current;
+          }
+          if (callback) {
+            callback(response);
+          }
+        });
+      };
+      var sendAll = function (operation, callback, extraProps, l) {
         var props = {
           nodes: nodes,
           links: l,
@@ -111,12 +179,123 @@ var QDR = (function (QDR) {
         if (extraProps) Object.assign(props, props, extraProps);
         QDRService.sendMethod(operation, props, function (response) {
           if (callback) {
-            console.log(`called ${operation} and all I got was`);
-            console.log(response);
             callback(response);
           }
         });
       };
+      // the topology as the server last had it, with its revision
+      var synced = null;
+      // set by d3 as the graph is laid out. The server doesn't use them
+      var layoutFields = { x: true, y: true, px: true, py: true, weight: true, fixed: true };
+      var snapshot = function (l) {
+        return {
+          topology: $scope.mockTopologyDir,
+          names: nodes.map(function (node) {
+            return node.name;
+          }),
+          // each node's fields as JSON, so later edits to the nodes don't change them
+          nodes: nodes.map(function (node) {
+            var fields = {};
+            for (var key in node) {
+              if (!layoutFields[key]) fields[key] = JSON.stringify(node[key]);
+            }
+            return fields;
+          }),
+          links: l,
+          settings: JSON.stringify(settings),
+        };
+      };
+      // the changes that make old into current, or null if it's simpler to send everything
+      var changesSince = function (old, current) {
+        var changes = [];
+        var wanted = {};
+        current.names.forEach(function (name) {
+          wanted[name] = true;
+        });
+        // the new position of each node that is kept
+        var moved = {};
+        var kept = [];
+        for (var i = 0; i < old.names.length; i++) {
+          if (wanted[old.names[i]]) {
+            moved[i] = kept.length;
+            kept.push(i);
+          }
+        }
+        // from the end, so the positions of the ones still to be removed don't change
+        for (var i = old.names.length - 1; i >= 0; i--) {
+          if (moved[i] === undefined) changes.push({ op: "remove", node: i });
+        }
+        for (var k = 0; k < kept.length; k++) {
+          // the console only adds nodes at the end
+          if (current.names[k] !== old.names[kept[k]]) return null;
+          var before = Object.assign({}, old.nodes[kept[k]]);
+          // the server numbers the nodes it moves down the way the console does
+          ["index", "id"].forEach(function (key) {
+            if (before[key] === JSON.stringify(kept[k])) before[key] = JSON.stringify(k);
+          });
+          var after = current.nodes[k];
+          var value = {};
+          var modified = false;
+          for (var key in after) {
+            if (after[key] !== before[key] && after[key] !== undefined) {
+              value[key] = nodes[k][key];
+              modified = true;
+            }
+          }
+          for (var key in before) {
+            if (before[key] !== undefined && after[key] === undefined) {
+              value[key] = null;
+              modified = true;
+            }
+          }
+          if (modified) changes.push({ op: "modify", node: k, value: value });
+        }
+        for (var k = kept.length; k < nodes.length; k++) {
+          changes.push({ op: "add", node: nodes[k] });
+        }
+
+        // the links the server has once the nodes are removed
+        var expected = [];
+        old.links.forEach(function (link) {
+          if (moved[link.source] !== undefined && moved[link.target] !== undefined)
+            expected.push({
+              source: moved[link.source],
+              target: moved[link.target],
+              cls: link.cls,
+            });
+        });
+        var count = {};
+        current.links.forEach(function (link) {
+          var key = JSON.stringify(link);
+          count[key] = (count[key] || 0) + 1;
+        });
+        var remaining = [];
+        expected.forEach(function (link) {
+          var key = JSON.stringify(link);
+          if (count[key]) {
+            count[key]--;
+            remaining.push(key);
+          } else {
+            changes.push({ op: "remove", link: link });
+          }
+        });
+        // the links that are left must come first, in the same order, and new ones after them
+        for (var i = 0; i < remaining.length; i++) {
+          if (JSON.stringify(current.links[i]) !== remaining[i]) return null;
+        }
+        for (var i = remaining.length; i < current.links.length; i++) {
+          changes.push({ op: "add", link: current.links[i] });
+        }
+
+        if (current.settings !== old.settings) {
+          var value = JSON.parse(current.settings);
+          for (var key in JSON.parse(old.settings)) {
+            if (!(key in value)) value[key] = null;
+          }
+          changes.push({ op: "modify", settings: value });
+        }
+        return changes;
+      };
 
       $scope.canDeploy = function () {
         return nodes.length > 0;
@@ -126,8 +305,11 @@ var QDR = (function (QDR) {
           switchTopology(newVal);
         }
       });
+      // routers loaded without their sections, by name. Their details are fetched when they are
+      // opened, and before the topology is sent to the server
+      var summarized = {};
       var switchTopology = function (topology) {
-        var props = { topology: topology };
+        var props = { topology: topology, summary: true };
         QDRService.sendMethod("SWITCH", props, function (response) {
           if ($scope.mockTopologies.indexOf(topology) == -1) {
             $timeout(function () {
@@ -136,6 +318,7 @@ var QDR = (function (QDR) {
           }
           nodes = [];
           links = [];
+          summarized = {};
           var savedPositions = localStorage[topology]
             ? angular.fromJson(localStorage[topology])
             : undefined;
@@ -159,11 +342,7 @@ var QDR = (function (QDR) {
               false
             );
             if (node["host"]) anode["host"] = node["host"];
-            sections.forEach(function (section) {
-              if (node[section + "s"]) {
-                anode[section + "s"] = node[section + "s"];
-              }
-            });
+            summarized[node.name] = true;
             nodes.push(anode);
           }
           for (var i = 0; i < response.links.length; ++i) {
@@ -177,50 +356,110 @@ var QDR = (function (QDR) {
             );
           }
 
-          for (var i = 0; i < nodes.length; ++i) {
-            var node = nodes[i];
-            sections.forEach(function (section) {
-              if (node[section + "s"]) {
-                for (var key in node[section + "s"]) {
-                  var type = section;
-                  if (section === "listener" && key == settings.http_port)
-                    type = "console";
-                  if (
-                    section === "connector" &&
-                    key == settings.artemis_port &&
-                    node["connectors"][settings.artemis_port + ""]["role"] ===
-                      "route-container"
-                  )
-                    type = "artemis";
-                  if (
-                    section === "connector" &&
-                    key == settings.qpid_port &&
-                    node["connectors"][settings.qpid_port + ""]["role"] ===
-                      "route-container"
-                  )
-                    type = "qpid";
-                  var sub = genNodeToAdd(node, type, key);
-                  nodes.push(sub);
-                  var source = node.id;
-                  var target = nodes.length - 1;
-                  getLink(
-                    source,
-                    target,
-                    sub.cdir,
-                    "small",
-                    source + "." + target
-                  );
-                }
-              }
-            });
-          }
-
           animate = true;
           QDR.log.info("switched to " + topology);
           initForceGraph();
           $timeout(function () {
             Core.notification("info", "switched to " + props.topology);
           });
+          followTopology(topology, response.revision);
+        });
+      };
+
+      // add a router's sections to it, and a node for each one connected to the router
+      var addSections = function (anode, details) {
+        sections.forEach(function (section) {
+          if (details[section + "s"]) {
+            anode[section + "s"] = details[section + "s"];
+            for (var key in details[section + "s"]) {
+              var type = section;
+              if (section === "listener" && key == settings.http_port)
+                type = "console";
+              if (
+                section === "connector" &&
+                key == settings.artemis_port &&
+                anode["connectors"][settings.artemis_port + ""]["role"] ===
+                  "route-container"
+              )
+                type = "artemis";
+              if (
+                section === "connector" &&
+                key == settings.qpid_port &&
+                anode["connectors"][settings.qpid_port + ""]["role"] ===
+                  "route-container"
+              )
+                type = "qpid";
+              var sub = genNodeToAdd(anode, type, key);
+              nodes.push(sub);
+              var source = anode.id;
+              var target = nodes.length - 1;
+              getLink(source, target, sub.cdir, "small", source + "." + target);
+            }
+          }
+        });
+        delete summarized[anode.name];
+      };
+      // fetch the sections of the routers that were loaded without them, then call callback.
+      // one router is fetched with GET-NODE, more than that with a single LOAD
+      var withDetails = function (routers, callback) {
+        var wanted = routers.filter(function (node) {
+          return summarized[node.name];
+        });
+        if (wanted.length === 0) return callback();
+        var topology = $scope.mockTopologyDir;
+        var done = function (details) {
+          // the user may have switched topologies in the meantime
+          if (topology !== $scope.mockTopologyDir) return;
+          wanted.forEach(function (node) {
+            if (summarized[node.name] && details[node.name])
+              addSections(node, details[node.name]);
+          });
+          animate = true;
+          initGraph();
+          initForce();
+          restart();
+          callback();
+        };
+        if (wanted.length === 1) {
+          QDRService.sendMethod(
+            "GET-NODE",
+            { topology: topology, name: wanted[0].name },
+            function (response) {
+              var details = {};
+              if (response && response.name) details[response.name] = response;
+              done(details);
+            }
+          );
+        } else {
+          QDRService.sendMethod("LOAD", { topology: topology }, function (response) {
+            var details = {};
+            response.nodes.forEach(function (node) {
+              details[node.name] = node;
+            });
+            done(details);
+          });
+        }
+      };
+
+      // reload the topology when its config files are changed by someone else.
+      // the server only sends a revision if it was started with --watch
+      var topologyEvents;
+      var followTopology = function (topology, revision) {
+        if (topologyEvents) topologyEvents.close();
+        topologyEvents = undefined;
+        if (revision === undefined || typeof EventSource === "undefined")
+          return;
+        topologyEvents = new EventSource(
+          `topology-stream?topology=${encodeURIComponent(topology)}&revision=${revision}`
+        );
+        topologyEvents.addEventListener("change", function (e) {
+          var change = JSON.parse(e.data);
+          if (change.origin !== "publish") {
+            $timeout(function () {
+              Core.notification("info", topology + " was changed on disk");
+            });
+            switchTopology(topology);
+          }
         });
       };
 
@@ -1529,6 +1768,11 @@ var QDR = (function (QDR) {
             d3.event.preventDefault();
             $scope.selected_node = d;
             if (!$scope.$$phase) $scope.$apply(); // we just changed a scope variable during an async event
+            // the menu lists the router's sections
+            if (d.cls === "router" && summarized[d.name])
+              withDetails([d], function () {
+                $timeout(function () {});
+              });
             var rm = relativeMouse();
             var menu =
               d.cls === "router" ? "action_menu" : "client_context_menu";
@@ -1932,6 +2176,14 @@ var QDR = (function (QDR) {
       }
 
       function doSetRouterHostDialog(node, multi) {
+        // the host is also set on the routers' listeners
+        var routers = multi ? nodes.filter(isSelectedNode) : [node];
+        if (routers.some(function (n) { return summarized[n.name]; })) {
+          withDetails(routers, function () {
+            doSetRouterHostDialog(node, multi);
+          });
+          return;
+        }
         var d = $uibModal.open({
           dialogClass: "modal dlg-large",
           backdrop: true,
@@ -2093,6 +2345,12 @@ var QDR = (function (QDR) {
       }
 
       function doEditDialog(node, entity, context, multi) {
+        if (summarized[node.name]) {
+          withDetails([node], function () {
+            doEditDialog(node, entity, context, multi);
+          });
+          return;
+        }
         var entity2key = {
           router: "name",
           log: "module",
@@ -2386,8 +2644,11 @@ var QDR = (function (QDR) {
     var success_state = "Deploy Completed";
     $scope.address = "";
     var pollTimer = null;
+    // only ask for the deployment output we haven't seen yet
+    var offset = 0;
+    $scope.status = "";
     function doPoll() {
-      QDRService.sendMethod("DEPLOY-STATUS", { config: dir }, function (
+      QDRService.sendMethod("DEPLOY-STATUS", { config: dir, offset: offset }, function (
         response
       ) {
         if (response[1] !== "DEPLOYING") {
@@ -2408,7 +2669,8 @@ var QDR = (function (QDR) {
           }
         }
         $timeout(function () {
-          $scope.status = response[0];
+          $scope.status += response[0];
+          offset = response[2];
           scrollToEnd();
           if ($scope.polling) pollTimer = setTimeout(doPoll, 1000);
         });
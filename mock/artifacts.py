@@ -0,0 +1,126 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zipfile
+
+class DeployArtifacts(object):
+    """The files a deployment sends to the hosts, named by the sha1 of their content
+
+    The console is zipped once for each version of its files and each
+    router config is copied once for each version of it, so a deployment
+    sends exactly what was staged even if the topology is published again
+    while it runs. deployed.json keeps the digests each host of a topology
+    was last deployed with, so hosts that already have them can be skipped.
+    """
+    def __init__(self, base):
+        self.base = base
+        self.lock = threading.Lock()
+        # sha1 of each console file, keyed by path, with the (mtime, size) it was taken at
+        self.digests = {}
+
+    def console(self, directory):
+        """Return (digest, path) of a zip of directory, making it if this version hasn't been zipped before"""
+        # the zip holds the directory itself, the way ansible's archive module made it
+        top = os.path.basename(os.path.normpath(directory))
+        files = []
+        for root, dirs, names in os.walk(directory):
+            dirs.sort()
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                files.append((path, os.path.join(top, os.path.relpath(path, directory)), self._digest(path)))
+        h = hashlib.sha1()
+        for path, arcname, digest in files:
+            h.update(("%s %s\n" % (arcname, digest)).encode('utf-8'))
+        digest = h.hexdigest()
+
+        path = self.base + "console-" + digest + ".zip"
+        if not os.path.exists(path):
+            os.makedirs(self.base, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.base, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as fout:
+                with zipfile.ZipFile(fout, 'w', zipfile.ZIP_DEFLATED) as z:
+                    for fpath, arcname, d in files:
+                        z.write(fpath, arcname)
+            os.replace(tmp, path)
+        return digest, os.path.abspath(path)
+
+    def config(self, text):
+        """Return (digest, path) of a copy of a router config"""
+        data = text.encode('utf-8')
+        digest = hashlib.sha1(data).hexdigest()
+        path = self.base + "configs/" + digest + ".conf"
+        if not os.path.exists(path):
+            os.makedirs(self.base + "configs/", exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.base + "configs/", suffix=".tmp")
+            with os.fdopen(fd, 'wb') as fout:
+                fout.write(data)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        return digest, os.path.abspath(path)
+
+    def deployed(self, topology):
+        """Return what each host of topology was last deployed with, by host"""
+        with self.lock:
+            return self._load().get(topology, {})
+
+    def record(self, topology, hosts):
+        """Remember that the hosts, a dict of what each was deployed with, now have it"""
+        with self.lock:
+            deployed = self._load()
+            deployed.setdefault(topology, {}).update(hosts)
+            os.makedirs(self.base, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.base, suffix=".tmp")
+            with os.fdopen(fd, 'w') as fout:
+                json.dump(deployed, fout, indent=1, sort_keys=True)
+            os.replace(tmp, self.base + "deployed.json")
+
+    def prune(self, keep):
+        """Remove the staged files whose paths are not in keep"""
+        keep = set(keep)
+        for directory, prefix in ((self.base, "console-"), (self.base + "configs/", "")):
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.abspath(os.path.join(directory, name))
+                if name.startswith(prefix) and name.endswith((".zip", ".conf")) and path not in keep:
+                    os.remove(path)
+
+    def _load(self):
+        try:
+            with open(self.base + "deployed.json") as fin:
+                return json.load(fin)
+        except (OSError, ValueError):
+            return {}
+
+    def _digest(self, path):
+        st = os.stat(path)
+        known = self.digests.get(path)
+        if known and known[0] == (st.st_mtime_ns, st.st_size):
+            return known[1]
+        with open(path, 'rb') as fin:
+            digest = hashlib.sha1(fin.read()).hexdigest()
+        self.digests[path] = ((st.st_mtime_ns, st.st_size), digest)
+        return digest
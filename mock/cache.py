@@ -0,0 +1,240 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+import os
+import pickle
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from . parser import parse
+from . metrics import metrics
+
+class ConfigCache(object):
+    """LRU cache of parsed config files keyed by path, mtime and size
+
+    An unchanged file costs one stat() instead of a full parse. If a
+    snapshot file is given the cache is loaded from it at startup and
+    written back by save() whenever new files have been parsed.
+
+    get_many() can stat and read files on read_threads threads and parse
+    them on parse_processes worker processes. Both are off by default.
+    """
+    # fewer changed files than this are parsed in this process
+    parallel_min = 32
+
+    def __init__(self, maxsize=10000, snapshot=None, read_threads=1, parse_processes=0):
+        self.maxsize = maxsize
+        self.snapshot = snapshot
+        self.read_threads = read_threads
+        self.parse_processes = parse_processes
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dirty = False
+        self.lock = threading.Lock()
+        # held for the whole of a save, so requests that save at once write one after the other
+        self.save_lock = threading.Lock()
+        self.readers = None
+        self.parsers = None
+        self._load()
+
+    def configure(self, maxsize=None, snapshot=None, read_threads=None, parse_processes=None):
+        with self.lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if snapshot is not None:
+                self.snapshot = snapshot
+                self._load()
+            if read_threads is not None and read_threads != self.read_threads:
+                self.read_threads = read_threads
+                if self.readers:
+                    self.readers.shutdown()
+                    self.readers = None
+            if parse_processes is not None and parse_processes != self.parse_processes:
+                self.parse_processes = parse_processes
+                if self.parsers:
+                    self.parsers.shutdown()
+                    self.parsers = None
+            self._evict()
+
+    def _load(self):
+        if self.snapshot and os.path.exists(self.snapshot):
+            try:
+                with open(self.snapshot, 'rb') as fp:
+                    self.entries.update(pickle.load(fp))
+            except Exception:
+                # a stale or corrupt snapshot just means a cold cache
+                self.entries.clear()
+            self._evict()
+
+    def get(self, path):
+        """Return the parsed sections for path, parsing it only if it changed on disk"""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry and entry[0] == stamp:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return self._copy(entry[1])
+            self.misses += 1
+
+        with metrics.stage("parse"):
+            with open(path) as f:
+                sections = parse(f)
+
+        with self.lock:
+            self.entries[path] = (stamp, sections)
+            self.entries.move_to_end(path)
+            self.dirty = True
+            self._evict()
+        return self._copy(sections)
+
+    def get_many(self, paths):
+        """Return the parsed sections for each of paths, in the same order
+
+        The same as calling get() for each path unless read_threads or
+        parse_processes is set.
+        """
+        if self.read_threads <= 1 and self.parse_processes <= 0:
+            return [self.get(path) for path in paths]
+
+        paths = [os.path.abspath(path) for path in paths]
+        stamps = self._map(_stamp, paths)
+        results = [None] * len(paths)
+        missing = []
+        with self.lock:
+            for i, path in enumerate(paths):
+                entry = self.entries.get(path)
+                if entry and entry[0] == stamps[i]:
+                    self.entries.move_to_end(path)
+                    self.hits += 1
+                    results[i] = self._copy(entry[1])
+                else:
+                    self.misses += 1
+                    missing.append(i)
+        if not missing:
+            return results
+
+        with metrics.stage("parse"):
+            texts = self._map(_read, [paths[i] for i in missing])
+            parsed = self._parse_all(texts)
+
+        with self.lock:
+            for i, sections in zip(missing, parsed):
+                self.entries[paths[i]] = (stamps[i], sections)
+                self.entries.move_to_end(paths[i])
+            self.dirty = True
+            self._evict()
+        for i, sections in zip(missing, parsed):
+            results[i] = self._copy(sections)
+        return results
+
+    def _map(self, fn, items):
+        if self.read_threads <= 1:
+            return [fn(item) for item in items]
+        with self.lock:
+            if self.readers is None:
+                self.readers = ThreadPoolExecutor(max_workers=self.read_threads)
+            readers = self.readers
+        return list(readers.map(fn, items))
+
+    def _parse_all(self, texts):
+        if self.parse_processes <= 0 or len(texts) < self.parallel_min:
+            return [parse(text.splitlines()) for text in texts]
+        with self.lock:
+            if self.parsers is None:
+                # the server is threaded, so don't fork it
+                # multiprocessing is slow to import and most runs never parse in other processes
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self.parsers = ProcessPoolExecutor(max_workers=self.parse_processes, mp_context=context)
+            parsers = self.parsers
+        # a few chunks per process keeps the workers busy without sending every file on its own
+        size = max(1, len(texts) // (self.parse_processes * 4))
+        chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+        parsed = []
+        for chunk in parsers.map(_parse_chunk, chunks):
+            parsed.extend(_intern(sections) for sections in chunk)
+        return parsed
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = 0
+            self.dirty = True
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "size": len(self.entries), "maxsize": self.maxsize}
+
+    def save(self):
+        """Write the cache to the snapshot file if one is configured and anything changed"""
+        with self.save_lock:
+            with self.lock:
+                if not self.snapshot or not self.dirty:
+                    return
+                snapshot = self.snapshot
+                data = dict(self.entries)
+                self.dirty = False
+            try:
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(snapshot)), suffix=".tmp")
+                with os.fdopen(fd, 'wb') as fp:
+                    pickle.dump(data, fp, pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, snapshot)
+            except Exception:
+                # try again on the next save
+                with self.lock:
+                    self.dirty = True
+                raise
+
+    def _evict(self):
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    @staticmethod
+    def _copy(sections):
+        # callers are free to modify what they get back without corrupting the cache
+        return [[s[0], dict(s[1])] for s in sections]
+
+def _stamp(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+def _parse_chunk(texts):
+    return [parse(text.splitlines()) for text in texts]
+
+def _intern(sections):
+    # names are interned by the parser but not when they are unpickled from a worker
+    return [[sys.intern(t), dict((sys.intern(k), v) for k, v in entries.items())] for t, entries in sections]
+
+# shared by every DirectoryConfigs in the process
+config_cache = ConfigCache()
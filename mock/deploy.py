@@ -0,0 +1,157 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+import os
+import shlex
+import subprocess
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+class DeployScheduler(object):
+    """Runs ansible-playbook over batches of hosts, a bounded number at a time
+
+    Every batch gets its own inventory file and ansible-playbook process.
+    Output from all of them goes to the DeployLog, each line prefixed with
+    the batch's hosts, and to logfile. The state, timing and return code of
+    each host is kept for DEPLOY_STATUS. command is what is run in place of
+    ansible-playbook, given the playbook and -i inventory.
+    """
+    def __init__(self, log, logfile, parallel=4, batch_size=1, command="ansible-playbook"):
+        self.command = shlex.split(command) if isinstance(command, str) else list(command)
+        self.log = log
+        self.logfile = logfile
+        self.parallel = parallel
+        self.batch_size = batch_size
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def start(self, playbook, inventory, inventory_base, callback, unchanged=()):
+        """Deploy in the background and call callback with "DONE" or the first non zero return code
+
+        inventory is the full inventory. Its hosts are split into batches of batch_size.
+        unchanged are hosts left out because they are up to date. They are
+        reported as UNCHANGED.
+        """
+        group = list(inventory)[0]
+        hosts = inventory[group]['hosts']
+        names = list(hosts)
+        batches = []
+        for i in range(0, len(names), self.batch_size):
+            batch = names[i:i + self.batch_size]
+            batch_inventory = {group: {'vars': inventory[group]['vars'],
+                                       'hosts': dict((h, hosts[h]) for h in batch)}}
+            batches.append((batch, batch_inventory, "%s-%d.yml" % (inventory_base, len(batches))))
+
+        with self.lock:
+            self.hosts = dict((h, {'state': "PENDING", 'returncode': None, 'start': None, 'end': None, 'duration': None})
+                              for h in names)
+            for h in unchanged:
+                self.hosts[h] = {'state': "UNCHANGED", 'returncode': 0, 'start': None, 'end': None, 'duration': 0}
+        self.log.start()
+        thread = threading.Thread(target=self._run, args=(playbook, batches, callback, unchanged))
+        thread.daemon = True
+        thread.start()
+
+    def status(self):
+        with self.lock:
+            return dict((h, dict(r)) for h, r in self.hosts.items())
+
+    # callback is always called, whatever goes wrong, or the deployment would never finish
+    def _run(self, playbook, batches, callback, unchanged):
+        codes = [1]
+        try:
+            with open(self.logfile, 'w') as fout:
+                if unchanged:
+                    self._output(fout, "[%s] already deployed, skipping\n" % ', '.join(unchanged))
+                with ThreadPoolExecutor(max_workers=max(1, self.parallel)) as pool:
+                    codes = list(pool.map(lambda b: self._batch(playbook, b, fout), batches))
+        except Exception:
+            traceback.print_exc()
+            with self.lock:
+                for h in self.hosts.values():
+                    if h['state'] in ("PENDING", "DEPLOYING"):
+                        h.update(state="FAILED", returncode=1)
+        finally:
+            failed = [c for c in codes if c]
+            callback(failed[0] if failed else "DONE")
+
+    # deploy a batch, which fails if anything goes wrong
+    def _batch(self, playbook, batch, fout):
+        try:
+            return self._deploy(playbook, batch, fout)
+        except Exception:
+            hosts = batch[0]
+            try:
+                self._output(fout, "[%s] deployment failed: %s" % (', '.join(hosts), traceback.format_exc()))
+            except Exception:
+                traceback.print_exc()
+            self._update(hosts, state="FAILED", returncode=1, end=time.time())
+            return 1
+
+    def _deploy(self, playbook, batch, fout):
+        # only needed when deploying
+        import yaml
+        hosts, inventory, inventory_file = batch
+        prefix = "[%s] " % ', '.join(hosts)
+        try:
+            with open(inventory_file, 'w') as n:
+                yaml.safe_dump(inventory, n, default_flow_style=False)
+
+            start = time.time()
+            self._update(hosts, state="DEPLOYING", start=start)
+            try:
+                proc = subprocess.Popen(self.command + [playbook, '-i', inventory_file],
+                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                        universal_newlines=True, bufsize=1)
+            except OSError as e:
+                self._output(fout, prefix + "unable to run %s: %s\n" % (self.command[0], e))
+                returncode = 127
+            else:
+                try:
+                    for line in proc.stdout:
+                        self._output(fout, prefix + line)
+                except BaseException:
+                    # nothing is reading its output any more
+                    proc.kill()
+                    proc.wait()
+                    raise
+                returncode = proc.wait()
+        finally:
+            try:
+                os.remove(inventory_file)
+            except OSError:
+                pass
+
+        end = time.time()
+        self._update(hosts, state="DONE" if returncode == 0 else "FAILED", returncode=returncode,
+                     end=end, duration=end - start)
+        return returncode
+
+    def _output(self, fout, line):
+        with self.lock:
+            fout.write(line)
+            fout.flush()
+        self.log.append(line)
+
+    def _update(self, hosts, **kwargs):
+        with self.lock:
+            for h in hosts:
+                self.hosts[h].update(kwargs)
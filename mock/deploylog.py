@@ -0,0 +1,98 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+import os
+import threading
+from bisect import bisect_right
+
+class DeployLog(object):
+    """Output of the running deployment, readable from any offset
+
+    The deploy thread appends output as it arrives. Readers either ask for
+    everything after an offset they already have, or follow() the log and
+    are woken up as new output is appended. Offsets keep increasing across
+    deployments; an offset from an earlier deployment reads the current one
+    from its beginning.
+    """
+    def __init__(self, path=None):
+        self.cond = threading.Condition()
+        self.chunks = []
+        self.starts = []
+        self.size = 0
+        self.base = 0
+        self.done = True
+        # show the output of the last deployment until a new one starts
+        if path and os.path.exists(path):
+            with open(path) as fin:
+                self._append(fin.read())
+
+    def start(self):
+        with self.cond:
+            self.chunks = []
+            self.starts = []
+            self.base = self.size
+            self.done = False
+            self.cond.notify_all()
+
+    def append(self, text):
+        with self.cond:
+            self._append(text)
+            self.cond.notify_all()
+
+    def finish(self):
+        with self.cond:
+            self.done = True
+            self.cond.notify_all()
+
+    def read(self, offset=0):
+        """Return the output after offset and the offset to use for the next read"""
+        with self.cond:
+            return self._read(offset)
+
+    def follow(self, offset=0, timeout=15):
+        """Yield (next offset, text) as output is appended until the deployment is done
+
+        text is None if nothing arrived within timeout seconds so the caller can
+        check that its client is still there.
+        """
+        while True:
+            with self.cond:
+                if self.size <= offset and not self.done:
+                    self.cond.wait(timeout)
+                text, next_offset = self._read(offset)
+                done = self.done
+            if text or not done:
+                yield next_offset, text or None
+            offset = next_offset
+            if done:
+                return
+
+    def _append(self, text):
+        if text:
+            self.chunks.append(text)
+            self.starts.append(self.size)
+            self.size += len(text)
+
+    def _read(self, offset):
+        offset = max(offset, self.base)
+        if offset >= self.size:
+            return "", self.size
+        i = bisect_right(self.starts, offset) - 1
+        text = self.chunks[i][offset - self.starts[i]:] + ''.join(self.chunks[i + 1:])
+        return text, self.size
@@ -0,0 +1,169 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+from . topology import sectionFields
+
+class EditError(ValueError):
+    pass
+
+class EditedTopology(object):
+    """The nodes, links and settings of a topology as the console last sent them
+
+    apply() makes a list of changes and returns the result at the next
+    revision. Each change is a dict with an op of "add", "remove" or
+    "modify" and one of:
+      node: a node to add, or the position of the node to remove or modify
+      link: a link to add, or the source, target and any other fields of the
+            first link to remove or modify
+      settings: settings to modify
+    value holds the fields a modify sets. A field set to None is removed.
+    Removing a node removes its links and moves the nodes after it down one
+    position, the way the console does. The nodes, links and settings that
+    are added or modified are checked, so a bad change is refused instead of
+    being kept and failing every request after it.
+
+    Nothing is changed in place. The lists are copied and the nodes and
+    links that change are replaced, so a request already given them sees
+    the same thing throughout.
+    """
+    __slots__ = ('revision', 'nodes', 'links', 'settings')
+
+    def __init__(self, revision, nodes, links, settings):
+        self.revision = revision
+        self.nodes = nodes
+        self.links = links
+        self.settings = settings
+
+    @staticmethod
+    def checked(revision, nodes, links, settings):
+        """Return an EditedTopology of a whole topology, or raise EditError if any of it is malformed"""
+        if not isinstance(nodes, list) or not isinstance(links, list) or not isinstance(settings, dict):
+            raise EditError("nodes and links must be lists and settings a dict")
+        for node in nodes:
+            _checked_node(node)
+        for link in links:
+            _checked_link(nodes, link)
+        _checked_settings(settings)
+        return EditedTopology(revision, nodes, links, settings)
+
+    def apply(self, changes):
+        # they come straight from the request, so anything else is an EditError, not a server error
+        if not isinstance(changes, list):
+            raise EditError("changes must be a list, not %s" % type(changes).__name__)
+        nodes = list(self.nodes)
+        links = list(self.links)
+        settings = self.settings
+        for change in changes:
+            if not isinstance(change, dict):
+                raise EditError("a change must be a dict, not %s" % str(change)[:200])
+            op = change.get('op')
+            if 'node' in change:
+                if op == 'add':
+                    nodes.append(_checked_node(change['node']))
+                    continue
+                p = _position(nodes, change['node'])
+                if op == 'remove':
+                    del nodes[p]
+                    # the console numbers its nodes by position
+                    for i in range(p, len(nodes)):
+                        n = nodes[i]
+                        moved = dict((k, i) for k in ('index', 'id') if n.get(k) == i + 1)
+                        if moved:
+                            nodes[i] = dict(n, **moved)
+                    links = [l if l['source'] < p and l['target'] < p else
+                             dict(l, source=l['source'] - (l['source'] > p), target=l['target'] - (l['target'] > p))
+                             for l in links if l['source'] != p and l['target'] != p]
+                elif op == 'modify':
+                    nodes[p] = _checked_node(_modified(nodes[p], change))
+                else:
+                    raise EditError("unknown node change " + str(op))
+            elif 'link' in change:
+                if op == 'add':
+                    links.append(_checked_link(nodes, change['link']))
+                    continue
+                i = _find_link(links, change['link'])
+                if op == 'remove':
+                    del links[i]
+                elif op == 'modify':
+                    links[i] = _checked_link(nodes, _modified(links[i], change))
+                else:
+                    raise EditError("unknown link change " + str(op))
+            elif 'settings' in change and op == 'modify':
+                settings = _checked_settings(_modified(settings, {'value': change['settings']}))
+            else:
+                raise EditError("unknown change " + str(change)[:200])
+        return EditedTopology(self.revision + 1, nodes, links, settings)
+
+def _position(nodes, p):
+    if not isinstance(p, int) or isinstance(p, bool) or not 0 <= p < len(nodes):
+        raise EditError("no node at position %s" % p)
+    return p
+
+def _checked_node(node):
+    if not isinstance(node, dict):
+        raise EditError("a node must be a dict, not %s" % str(node)[:200])
+    for field in ('name', 'host', 'nodeType', 'cls'):
+        if node.get(field) is not None and not isinstance(node[field], str):
+            raise EditError("a node's %s must be a string, not %s" % (field, str(node[field])[:200]))
+    for field in ('index', 'id'):
+        if node.get(field) is not None and (not isinstance(node[field], int) or isinstance(node[field], bool)):
+            raise EditError("a node's %s must be an int, not %s" % (field, str(node[field])[:200]))
+    # each section field is a dict of the node's sections of that type, by key
+    for field in sectionFields:
+        sections = node.get(field)
+        if sections is not None and (not isinstance(sections, dict) or
+                                     not all(isinstance(entries, dict) for entries in sections.values())):
+            raise EditError("a node's %s must be a dict of dicts, not %s" % (field, str(sections)[:200]))
+    return node
+
+def _checked_link(nodes, link):
+    if not isinstance(link, dict):
+        raise EditError("a link must be a dict, not %s" % str(link)[:200])
+    for end in ('source', 'target'):
+        _position(nodes, link.get(end))
+    return link
+
+def _checked_settings(settings):
+    for field in ('http_port', 'internal_port'):
+        if field in settings:
+            try:
+                int(settings[field])
+            except (TypeError, ValueError):
+                raise EditError("%s must be a port number, not %s" % (field, str(settings[field])[:200]))
+    return settings
+
+def _find_link(links, fields):
+    if not isinstance(fields, dict):
+        raise EditError("a link is given by its fields, not %s" % fields)
+    for i, l in enumerate(links):
+        if all(l.get(k) == v for k, v in fields.items()):
+            return i
+    raise EditError("no link %s" % fields)
+
+def _modified(d, change):
+    value = change.get('value')
+    if not isinstance(value, dict):
+        raise EditError("modify needs a dict of the fields to set, not %s" % str(value)[:200])
+    d = dict(d)
+    for k, v in value.items():
+        if v is None:
+            d.pop(k, None)
+        else:
+            d[k] = v
+    return d
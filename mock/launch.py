@@ -0,0 +1,262 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+# Start the routers of a topology directory on this host:
+#   python -m mock.launch start topologies/config-2/
+#   python -m mock.launch stop topologies/config-2/
+
+import argparse
+import json
+import os
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from . parser import parse
+from . topology import localHosts
+
+class Launcher(object):
+    """Starts the routers of a topology directory on this host and stops them again
+
+    Up to parallel routers are started at once. A router is ready once every
+    port it listens on accepts a connection, and is stopped again if that
+    takes more than timeout seconds. The pids of the routers are kept in
+    launch/pids.json in the directory so they can be stopped later, even by
+    another process, and the output of each router goes to launch/<name>.log.
+    """
+    probe_interval = 0.05
+    # seconds a router has to exit once it is asked to
+    grace = 5.0
+
+    def __init__(self, command="qdrouterd", parallel=8, timeout=30.0):
+        self.command = shlex.split(command) if isinstance(command, str) else list(command)
+        self.parallel = parallel
+        self.timeout = timeout
+        # the routers started by this process, by pid, so they can be reaped
+        self.procs = {}
+        self.lock = threading.Lock()
+
+    def start(self, directory):
+        """Start a router for each .conf file in directory, after stopping the ones started there before
+
+        Returns {"routers": {name: result}, "elapsed": seconds}. Each result has
+        the router's pid, the ports probed, its state (READY, FAILED or TIMEOUT),
+        the seconds it took to be ready, its return code if it exited and an
+        error if it couldn't be started, for example because its config can't be parsed.
+        """
+        self.stop(directory)
+        rundir = os.path.join(directory, "launch")
+        os.makedirs(rundir, exist_ok=True)
+        start = time.time()
+        futures = []
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.parallel)) as pool:
+                for f in sorted(glob(os.path.join(directory, '*.conf'))):
+                    futures.append(pool.submit(self._launch, f, rundir))
+        finally:
+            # the routers that did start are written down whatever happened, so stop() finds them
+            results = [f.result() for f in futures if f.done() and not f.cancelled() and f.exception() is None]
+            launched = dict((r['name'], {'pid': r['pid'], 'config': r['config']}) for r in results if r['state'] == "READY")
+            with open(os.path.join(rundir, "pids.json"), 'w') as fout:
+                json.dump(launched, fout, indent=1)
+        for f in futures:
+            f.result()
+        routers = {}
+        for r in results:
+            del r['config']
+            routers[r.pop('name')] = r
+        return {"routers": routers, "elapsed": time.time() - start}
+
+    def stop(self, directory):
+        """Stop the routers started in directory and return the names of those that were running"""
+        pidfile = os.path.join(directory, "launch", "pids.json")
+        try:
+            with open(pidfile) as fin:
+                launched = json.load(fin)
+        except (OSError, ValueError):
+            return []
+        stopping = [name for name, entry in launched.items() if self._running(entry)]
+        for name in stopping:
+            _signal(launched[name]['pid'], signal.SIGTERM)
+        deadline = time.time() + self.grace
+        for name in stopping:
+            while self._running(launched[name]) and time.time() < deadline:
+                time.sleep(self.probe_interval)
+            if self._running(launched[name]):
+                _signal(launched[name]['pid'], signal.SIGKILL)
+        os.remove(pidfile)
+        return sorted(stopping)
+
+    def status(self, directory):
+        """Return the pid of each router started in directory and whether it is still running"""
+        try:
+            with open(os.path.join(directory, "launch", "pids.json")) as fin:
+                launched = json.load(fin)
+        except (OSError, ValueError):
+            return {}
+        return dict((name, {'pid': entry['pid'], 'running': self._running(entry)}) for name, entry in launched.items())
+
+    def _launch(self, path, rundir):
+        name = os.path.basename(path)[:-len(".conf")]
+        result = {'name': name, 'config': os.path.abspath(path), 'pid': None, 'ports': [],
+                  'state': "FAILED", 'latency': None, 'returncode': None}
+        try:
+            self._start(path, rundir, result)
+        except Exception as e:
+            # a config that can't be read or parsed fails its own router, not the others
+            result['error'] = "%s: %s" % (type(e).__name__, e)
+            result['state'] = "FAILED"
+            with self.lock:
+                proc = self.procs.get(result['pid'])
+            if proc is not None and proc.poll() is None:
+                proc.kill()
+                proc.wait()
+        return result
+
+    # start one router, filling in its result as it goes
+    def _start(self, path, rundir, result):
+        name = result['name']
+        config = result['config']
+        with open(path) as fin:
+            endpoints = _listeners(parse(fin))
+        result['ports'] = [port for host, port in endpoints]
+        # otherwise whatever has the port would make the router look ready
+        busy = [port for host, port in endpoints if _accepts((host, port))]
+        if busy:
+            result['error'] = "port %s already in use" % ', '.join(str(port) for port in busy)
+            return
+        start = time.time()
+        with open(os.path.join(rundir, name + ".log"), 'wb') as log:
+            try:
+                # in its own session so it outlives whoever launched it
+                proc = subprocess.Popen(self.command + ['-c', config], stdin=subprocess.DEVNULL, stdout=log,
+                                        stderr=subprocess.STDOUT, start_new_session=True)
+            except OSError as e:
+                result['error'] = str(e)
+                return
+        with self.lock:
+            self.procs[proc.pid] = proc
+        result['pid'] = proc.pid
+
+        waiting = endpoints
+        while True:
+            if proc.poll() is not None:
+                result['returncode'] = proc.returncode
+                break
+            waiting = [e for e in waiting if not _accepts(e)]
+            if not waiting:
+                result['state'] = "READY"
+                result['latency'] = time.time() - start
+                break
+            if time.time() - start > self.timeout:
+                result['state'] = "TIMEOUT"
+                proc.kill()
+                proc.wait()
+                break
+            time.sleep(self.probe_interval)
+
+    def _running(self, entry):
+        pid = entry['pid']
+        with self.lock:
+            proc = self.procs.get(pid)
+            if proc is not None:
+                if proc.poll() is None:
+                    return True
+                del self.procs[pid]
+                return False
+        # started by another process. Make sure the pid hasn't been reused
+        try:
+            with open("/proc/%d/cmdline" % pid, 'rb') as fin:
+                return entry['config'].encode() in fin.read()
+        except FileNotFoundError:
+            return False
+        except OSError:
+            try:
+                os.kill(pid, 0)
+            except OSError:
+                return False
+            return True
+
+def _listeners(sections):
+    # the (host, port) to probe for each listener in a config file
+    endpoints = []
+    for sect in sections:
+        if sect[0] == 'listener':
+            host = sect[1].get('host')
+            port = sect[1].get('port', 'amqp')
+            try:
+                port = 5672 if port == 'amqp' else int(port)
+            except ValueError:
+                continue
+            endpoints.append(('127.0.0.1' if not host or host in localHosts else host, port))
+    return endpoints
+
+def _accepts(endpoint):
+    try:
+        socket.create_connection(endpoint, timeout=0.5).close()
+    except OSError:
+        return False
+    return True
+
+def _signal(pid, sig):
+    try:
+        os.kill(pid, sig)
+    except OSError:
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description='Start or stop the routers of a topology directory on this host.')
+    parser.add_argument("action", choices=["start", "stop", "status"])
+    parser.add_argument("directory", help="directory containing the router config files")
+    parser.add_argument("--command", default="qdrouterd", help="command that runs a router, given -c config (default: %(default)s)")
+    parser.add_argument("--parallel", type=int, default=8, help="routers to start at once (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=30.0,
+                        help="seconds a router has to open its listener ports (default: %(default)s)")
+    args = parser.parse_args()
+
+    launcher = Launcher(args.command, args.parallel, args.timeout)
+    directory = os.path.join(args.directory, '')
+    if args.action == "stop":
+        for name in launcher.stop(directory):
+            print ("stopped", name)
+        return
+    if args.action == "status":
+        for name, entry in sorted(launcher.status(directory).items()):
+            print ("%-20s %8d %s" % (name, entry['pid'], "running" if entry['running'] else "exited"))
+        return
+
+    launched = launcher.start(directory)
+    failed = 0
+    for name, result in sorted(launched['routers'].items()):
+        if result['state'] == "READY":
+            print ("%-20s %8d ready in %7.1fms" % (name, result['pid'], result['latency'] * 1000))
+        else:
+            failed += 1
+            print ("%-20s %8s %s %s" % (name, result['pid'] or '-', result['state'],
+                                        result.get('error') or "see " + os.path.join(directory, "launch", name + ".log")))
+    print ("started %d of %d routers in %.1fs" % (len(launched['routers']) - failed, len(launched['routers']), launched['elapsed']))
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
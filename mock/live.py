@@ -0,0 +1,237 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+import os
+import threading
+from collections import deque
+from glob import glob
+from . metrics import metrics
+from . topology import Node, Topology, resolve
+
+class LiveIndex(object):
+    """The nodes and links of a topology directory, kept up to date one file at a time
+
+    refresh() re-reads the named files and relinks only the routers with a
+    connector that could match a listener that was added or removed. Every
+    refresh that changes something gets a new revision, and follow() yields
+    the changes as they happen.
+
+    build(path, ports) returns the Node for a config file, or None, and fills
+    in ports the way Manager._node_ does. Call refresh(None) to read every
+    file to begin with.
+    """
+    # changes kept for clients that are catching up
+    history = 100
+
+    def __init__(self, name, path, build):
+        self.name = name
+        self.path = path
+        self.build = build
+        self.cond = threading.Condition()
+        self.revision = 0
+        self.changes = deque(maxlen=self.history)
+        self.files = {}
+        self.by_endpoint = {}
+        self.by_port = {}
+        self.conns_by_endpoint = {}
+        self.conns_by_port = {}
+        # the files each listener's connectors are in, and the listeners each file connects to
+        self.targets = {}
+        self.linked = {}
+        self.closed = False
+
+    def refresh(self, names, origin="watch"):
+        """Re-read the named files, or every file if names is None. Return the revision"""
+        with metrics.stage("refresh"):
+            with self.cond:
+                if names is None:
+                    names = set(self.files) | set(os.path.basename(f) for f in glob(self.path + '*.conf'))
+                changed = []
+                removed = []
+                errors = {}
+                affected = set()
+                for name in sorted(names):
+                    state = self._update(name, affected)
+                    if state == "removed":
+                        removed.append(name[:-len(".conf")])
+                    elif state:
+                        changed.append(name[:-len(".conf")])
+                        if self.files[name]['error']:
+                            errors[name[:-len(".conf")]] = self.files[name]['error']
+                for target in affected:
+                    self._relink(target)
+                if changed or removed:
+                    self.revision += 1
+                    self.changes.append({"revision": self.revision, "topology": self.name, "origin": origin,
+                                         "changed": changed, "removed": removed, "errors": errors})
+                    self.cond.notify_all()
+                return self.revision
+
+    def topology(self, summary=False):
+        """Return a Topology in the form LOAD builds it, with nodes indexed by glob order"""
+        names = [os.path.basename(f) for f in glob(self.path + '*.conf')]
+        # pick up anything the watcher hasn't told us about yet
+        if set(names) != set(self.files):
+            self.refresh(set(names) ^ set(self.files))
+        with self.cond:
+            index = dict((name, i) for i, name in enumerate(names))
+            nodes = []
+            sources = []
+            targets = []
+            for i, name in enumerate(names):
+                entry = self.files.get(name)
+                node = entry and entry['node']
+                if node:
+                    node = Node(i, node.name, node.nodeType, node.host, sections={} if summary else node.sections)
+                nodes.append(node)
+                if entry:
+                    # the same order _links_ gives: by listener, then by connecting file
+                    for l in range(len(entry['listeners'])):
+                        for target in sorted(index[t] for t in self.targets[(name, l)] if t in index):
+                            sources.append(i)
+                            targets.append(target)
+            return Topology(nodes, sources, targets)
+
+    def follow(self, revision, timeout=15):
+        """Yield the changes after revision as they happen
+
+        None is yielded if nothing happened within timeout seconds and a
+        change with "resync" set if the changes after revision are no longer
+        known, so the client should load the whole topology again.
+        """
+        while True:
+            with self.cond:
+                if self.revision <= revision and not self.closed:
+                    self.cond.wait(timeout)
+                if self.closed:
+                    return
+                current = self.revision
+                if revision > current or (current > revision and self.changes[0]["revision"] > revision + 1):
+                    pending = [{"revision": current, "topology": self.name, "resync": True}]
+                else:
+                    pending = [c for c in self.changes if c["revision"] > revision]
+            if not pending:
+                yield None
+            for change in pending:
+                yield change
+            revision = current
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def _update(self, name, affected):
+        # returns "added", "changed", "removed" or None if the file is as we last saw it
+        path = self.path + name
+        try:
+            st = os.stat(path)
+            stamp = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = None
+        old = self.files.get(name)
+        if (old and old['stamp']) == stamp:
+            return None
+
+        touched = set()
+        if old:
+            self._remove(name, old, touched)
+        if stamp:
+            ports = {'connectors': [], 'listeners': [], 'host': None}
+            error = None
+            try:
+                node = self.build(path, ports)
+            except OSError:
+                # removed since the stat
+                stamp = None
+            except Exception as e:
+                # leave a file that can't be read out of the topology until it changes again
+                node = None
+                ports = {'connectors': [], 'listeners': [], 'host': None}
+                error = str(e)
+        if stamp:
+            entry = {'stamp': stamp, 'node': node, 'error': error,
+                     'listeners': [resolve(host, ports['host'], port) for host, port in ports['listeners']],
+                     'connectors': [resolve(host, ports['host'], port) for host, port in ports['connectors']]}
+            self._add(name, entry, touched)
+            affected.add(name)
+        else:
+            affected.discard(name)
+
+        # connectors that matched, or could now match, one of the listeners that changed
+        for key in touched:
+            affected.update(self.conns_by_endpoint.get(key, ()))
+            affected.update(self.conns_by_port.get(key[1], ()))
+        if not stamp:
+            return "removed" if old else None
+        return "changed" if old else "added"
+
+    def _add(self, name, entry, touched):
+        self.files[name] = entry
+        for l, key in enumerate(entry['listeners']):
+            self.by_endpoint.setdefault(key, set()).add((name, l))
+            self.by_port.setdefault(key[1], set()).add((name, l))
+            self.targets[(name, l)] = set()
+            touched.add(key)
+        for key in entry['connectors']:
+            self.conns_by_endpoint.setdefault(key, set()).add(name)
+            self.conns_by_port.setdefault(key[1], set()).add(name)
+
+    def _remove(self, name, entry, touched):
+        del self.files[name]
+        for l, key in enumerate(entry['listeners']):
+            _discard(self.by_endpoint, key, (name, l))
+            _discard(self.by_port, key[1], (name, l))
+            del self.targets[(name, l)]
+            touched.add(key)
+        for key in entry['connectors']:
+            _discard(self.conns_by_endpoint, key, name)
+            _discard(self.conns_by_port, key[1], name)
+        self._unlink(name)
+
+    def _unlink(self, target):
+        for listener in self.linked.pop(target, ()):
+            if listener in self.targets:
+                self.targets[listener].discard(target)
+
+    def _relink(self, target):
+        # the same matching as Manager._links_
+        self._unlink(target)
+        entry = self.files.get(target)
+        if not entry:
+            return
+        linked = set()
+        for key in entry['connectors']:
+            matches = self.by_endpoint.get(key)
+            if matches is None:
+                matches = self.by_port.get(key[1])
+                if matches is None or len(matches) > 1:
+                    continue
+            for listener in matches:
+                self.targets[listener].add(target)
+                linked.add(listener)
+        if linked:
+            self.linked[target] = linked
+
+def _discard(index, key, value):
+    values = index.get(key)
+    if values is not None:
+        values.discard(value)
+        if not values:
+            del index[key]
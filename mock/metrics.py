@@ -0,0 +1,151 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+import cProfile
+import io
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+prefix = "dispatch_topology_"
+
+class Metrics(object):
+    """Per operation counts, latency histograms, byte counts and stage timings
+
+    Manager.operation times every operation. Code that runs inside an operation
+    can time parts of it with stage(name), which is attributed to the operation
+    running on the current thread. render() returns everything in the
+    Prometheus text exposition format.
+    """
+    buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.operations = {}
+        self.stages = {}
+        self.profile = None
+
+    @contextmanager
+    def operation(self, name, profile=False):
+        """Time an operation, optionally capturing a cProfile of it"""
+        self.local.operation = name
+        profiler = cProfile.Profile() if profile else None
+        start = time.time()
+        failed = True
+        try:
+            if profiler:
+                profiler.enable()
+            yield
+            failed = False
+        finally:
+            elapsed = time.time() - start
+            if profiler:
+                profiler.disable()
+                self._save_profile(name, profiler)
+            self.local.operation = None
+            self._observe(name, elapsed, failed)
+
+    @contextmanager
+    def stage(self, name):
+        """Time part of the current operation"""
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            key = (getattr(self.local, 'operation', None) or "none", name)
+            with self.lock:
+                stage = self.stages.setdefault(key, [0, 0.0])
+                stage[0] += 1
+                stage[1] += elapsed
+
+    def observe_bytes(self, name, request_bytes, response_bytes):
+        with self.lock:
+            op = self._op(name)
+            op["request_bytes"] += request_bytes
+            op["response_bytes"] += response_bytes
+
+    def last_profile(self):
+        return self.profile
+
+    def render(self):
+        out = []
+        with self.lock:
+            ops = sorted(self.operations.items())
+            stages = sorted(self.stages.items())
+
+            out.append("# HELP %soperation_seconds Time spent handling each operation" % prefix)
+            out.append("# TYPE %soperation_seconds histogram" % prefix)
+            for name, op in ops:
+                cumulative = 0
+                for le, count in zip(self.buckets, op["buckets"]):
+                    cumulative += count
+                    out.append('%soperation_seconds_bucket{operation="%s",le="%s"} %d' % (prefix, name, le, cumulative))
+                out.append('%soperation_seconds_bucket{operation="%s",le="+Inf"} %d' % (prefix, name, op["count"]))
+                out.append('%soperation_seconds_sum{operation="%s"} %f' % (prefix, name, op["sum"]))
+                out.append('%soperation_seconds_count{operation="%s"} %d' % (prefix, name, op["count"]))
+
+            for metric, key, help in (("operation_errors_total", "errors", "Operations that raised an exception"),
+                                      ("request_bytes_total", "request_bytes", "Bytes received in operation requests"),
+                                      ("response_bytes_total", "response_bytes", "Bytes sent in operation responses")):
+                out.append("# HELP %s%s %s" % (prefix, metric, help))
+                out.append("# TYPE %s%s counter" % (prefix, metric))
+                for name, op in ops:
+                    out.append('%s%s{operation="%s"} %d' % (prefix, metric, name, op[key]))
+
+            out.append("# HELP %sstage_seconds_total Time spent in each stage of an operation" % prefix)
+            out.append("# TYPE %sstage_seconds_total counter" % prefix)
+            for (name, stage), (count, total) in stages:
+                out.append('%sstage_seconds_total{operation="%s",stage="%s"} %f' % (prefix, name, stage, total))
+            out.append("# HELP %sstage_calls_total Number of times each stage of an operation ran" % prefix)
+            out.append("# TYPE %sstage_calls_total counter" % prefix)
+            for (name, stage), (count, total) in stages:
+                out.append('%sstage_calls_total{operation="%s",stage="%s"} %d' % (prefix, name, stage, count))
+        return "\n".join(out) + "\n"
+
+    def _op(self, name):
+        if name not in self.operations:
+            self.operations[name] = {"count": 0, "errors": 0, "sum": 0.0, "buckets": [0] * len(self.buckets),
+                                     "request_bytes": 0, "response_bytes": 0}
+        return self.operations[name]
+
+    def _observe(self, name, elapsed, failed):
+        with self.lock:
+            op = self._op(name)
+            op["count"] += 1
+            op["sum"] += elapsed
+            if failed:
+                op["errors"] += 1
+            i = bisect_left(self.buckets, elapsed)
+            if i < len(self.buckets):
+                op["buckets"][i] += 1
+
+    def _save_profile(self, name, profiler):
+        # pstats is slow to import and only needed once something is profiled
+        import pstats
+        out = io.StringIO()
+        out.write("profile of %s\n" % name)
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(50)
+        with self.lock:
+            self.profile = out.getvalue()
+
+# shared by the Manager and everything it calls
+metrics = Metrics()
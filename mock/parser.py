@@ -0,0 +1,103 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+import re
+import sys
+
+_name = re.compile(r'[\w-]+$')
+
+class ParseError(ValueError):
+    """A config file line that could not be parsed"""
+    def __init__(self, message, lineno, line):
+        super(ParseError, self).__init__("line %d: %s: %r" % (lineno, message, line))
+        self.message = message
+        self.lineno = lineno
+        self.line = line
+
+    def __reduce__(self):
+        # so an error raised in a parse worker process can be sent back
+        return (ParseError, (self.message, self.lineno, self.line))
+
+# modified from qpid-dispatch/python/qpid_dispatch_internal/management/config.py
+def parse(lines):
+    """Parse config file format into a section list
+
+    lines can be any iterable of strings, typically an open file. Each line is
+    handled as it is read so the file is never joined into a single string.
+    Returns a list of [section_type, {attribute: value}] pairs. Section types
+    and attribute names are interned so every cached file shares them.
+    """
+    sections = []
+    entries = None
+    lineno = 0
+    for lineno, raw in enumerate(lines, 1):
+        line = raw.strip()
+        if not line:
+            continue
+        if line[0] == '#':
+            # deploy_host is stored as a comment so qdrouterd ignores it
+            if not line.startswith("#deploy_host:"):
+                continue
+            line = line[1:]
+
+        key, sep, value = line.partition(':')
+        key = key.strip()
+        # 'pattern:' is a special snowflake.  It allows '#' characters in
+        # its value, so they cannot be treated as comment delimiters
+        if sep and key.lower() == "pattern":
+            value = value.split(None, 1)
+            if not value:
+                raise ParseError("missing value", lineno, raw)
+            if entries is None:
+                raise ParseError("attribute outside of a section", lineno, raw)
+            entries[sys.intern(key)] = value[0]
+            continue
+
+        line = line.split('#', 1)[0].rstrip()
+        if not line:
+            continue
+        if line[-1] == '{':
+            name = line[:-1].rstrip()
+            if not _name.match(name):
+                raise ParseError("invalid section name", lineno, raw)
+            if entries is not None:
+                raise ParseError("section opened before previous one was closed", lineno, raw)
+            entries = {}
+            sections.append([sys.intern(name), entries])
+        elif line == '}':
+            if entries is None:
+                raise ParseError("unmatched '}'", lineno, raw)
+            entries = None
+        elif ':' in line:
+            key, _, value = line.partition(':')
+            key = key.rstrip()
+            value = value.strip()
+            if not _name.match(key):
+                raise ParseError("invalid attribute name", lineno, raw)
+            if not value:
+                raise ParseError("missing value", lineno, raw)
+            if entries is None:
+                raise ParseError("attribute outside of a section", lineno, raw)
+            entries[sys.intern(key)] = value
+        else:
+            raise ParseError("unrecognized line", lineno, raw)
+
+    if entries is not None:
+        raise ParseError("section not closed at end of file", lineno, "")
+    return sections
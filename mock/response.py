@@ -0,0 +1,111 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+import gzip
+import hashlib
+import os
+import threading
+
+# content types worth compressing
+compressible = ('text/', 'application/javascript', 'application/json', 'application/xml', 'image/svg+xml')
+
+def etag_matches(etag, if_none_match):
+    """True if an If-None-Match header value names etag"""
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(',')]
+    return '*' in tags or etag in tags or ('W/' + etag) in tags
+
+class PreparedResponse(object):
+    """A response body that is already encoded, with its gzip variant and ETag
+
+    gzipped is None if compressing the body wouldn't make it smaller.
+    """
+    def __init__(self, body, content_type='application/json', level=6):
+        self.body = body
+        self.content_type = content_type
+        self.gzipped = None
+        if content_type.startswith(compressible):
+            gzipped = gzip.compress(body, level)
+            if len(gzipped) < len(body):
+                self.gzipped = gzipped
+        self.etag = '"%s"' % hashlib.sha1(body).hexdigest()
+
+    def matches(self, if_none_match):
+        return etag_matches(self.etag, if_none_match)
+
+class FileResponse(object):
+    """A file kept in memory as a PreparedResponse until it changes on disk"""
+    def __init__(self, path, content_type='application/json'):
+        self.path = path
+        self.content_type = content_type
+        self.stamp = None
+        self.response = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        st = os.stat(self.path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self.lock:
+            if stamp != self.stamp:
+                with open(self.path, 'rb') as fp:
+                    self.response = PreparedResponse(fp.read(), self.content_type)
+                self.stamp = stamp
+            return self.response
+
+class StaticFiles(object):
+    """The files the console is made of, kept in memory until they change on disk
+
+    Each file is a PreparedResponse, compressed once when it is read. Files
+    bigger than max_file_size aren't kept, nor is anything once max_size
+    bytes are, and get() returns None for them so they are sent from disk.
+    """
+    def __init__(self, max_size=64 << 20, max_file_size=1 << 20):
+        self.max_size = max_size
+        self.max_file_size = max_file_size
+        self.files = {}
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, path, st, content_type):
+        """Return the PreparedResponse for the file at path, whose os.stat is st, or None"""
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self.lock:
+            entry = self.files.get(path)
+            if entry is not None and entry[0] == stamp:
+                return entry[1]
+        if st.st_size > self.max_file_size or self.size + st.st_size > self.max_size:
+            return None
+        with open(path, 'rb') as fp:
+            body = fp.read()
+        if len(body) != st.st_size:
+            # being written. Send it from disk until it settles
+            return None
+        response = PreparedResponse(body, content_type, 9)
+        with self.lock:
+            old = self.files.pop(path, None)
+            if old is not None:
+                self.size -= _cost(old[1])
+            if self.size + _cost(response) <= self.max_size:
+                self.files[path] = (stamp, response)
+                self.size += _cost(response)
+        return response
+
+def _cost(response):
+    return len(response.body) + len(response.gzipped or b'')
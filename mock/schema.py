@@ -19,28 +19,67 @@
 #
 
 import json
+import os
+import pickle
+import threading
+
+_lock = threading.Lock()
 
 class Schema(object):
     schema = {}
+    # compiled form of schema.json, reused until schema.json changes
+    cache_file = ".schema.cache"
+    # schema.json is read from the top level directory the first time it is needed unless init was called
+    root = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '')
+    loaded = False
+
+    @staticmethod
+    def entity(entity):
+        if not Schema.loaded:
+            with _lock:
+                if not Schema.loaded:
+                    Schema.init(Schema.root)
+        return Schema.schema[entity]
 
     @staticmethod
     def i(entity, attribute):
-        return Schema.schema[entity]["attributeNames"].index(attribute)
+        return Schema.entity(entity)["attributeIndex"][attribute]
 
     @staticmethod
     def type(entity):
-        return Schema.schema[entity]["fullyQualifiedType"]
+        return Schema.entity(entity)["fullyQualifiedType"]
 
     @staticmethod
     def attrs(entity):
-        return Schema.schema[entity]['attributeNames']
+        return Schema.entity(entity)['attributeNames']
+
+    @staticmethod
+    def attrset(entity):
+        return Schema.entity(entity)['attributeSet']
 
     @staticmethod
     def default(entity, attribute):
-        return Schema.schema[entity]["defaults"].get(attribute)
+        return Schema.entity(entity)["defaults"].get(attribute)
+
+    @staticmethod
+    def defaults(entity):
+        return Schema.entity(entity)["defaults"]
 
     @staticmethod
     def init(path=''):
+        st = os.stat(path+"schema.json")
+        stamp = (st.st_mtime_ns, st.st_size)
+        try:
+            with open(path+Schema.cache_file, 'rb') as fp:
+                cached = pickle.load(fp)
+            if cached["stamp"] == stamp:
+                Schema.schema.clear()
+                Schema.schema.update(cached["schema"])
+                Schema.loaded = True
+                return
+        except Exception:
+            pass
+
         with open(path+"schema.json") as fp:
             data = json.load(fp)
             for entity in data["entityTypes"]:
@@ -52,3 +91,16 @@ class Schema(object):
                     if "default" in data["entityTypes"][entity]["attributes"][attribute]:
                         Schema.schema[entity]["defaults"][attribute] = data["entityTypes"][entity]["attributes"][attribute]["default"]
                 Schema.schema[entity]["attributeNames"].append("type")
+                names = Schema.schema[entity]["attributeNames"]
+                Schema.schema[entity]["attributeSet"] = frozenset(names)
+                index = Schema.schema[entity]["attributeIndex"] = {}
+                for i, name in enumerate(names):
+                    index.setdefault(name, i)
+
+        Schema.loaded = True
+        try:
+            with open(path+Schema.cache_file, 'wb') as fp:
+                pickle.dump({"stamp": stamp, "schema": Schema.schema}, fp, pickle.HIGHEST_PROTOCOL)
+        except (IOError, OSError):
+            # not being able to write the cache only costs the next startup some time
+            pass
@@ -20,9 +20,14 @@
 import json
 import re
 from . schema import Schema
-import pdb
+
+# characters that json.dumps escapes in a string
+_needs_escape = re.compile(r'[^\ -~]|[\\"]')
 
 class ConfigSection(object):
+    # entries that are written as comments so qdrouterd ignores them
+    commented = ()
+
     def __init__(self, type, defaults, ignore, forced, opts):
         self.type = type
         self.entries = {}
@@ -30,12 +35,14 @@ class ConfigSection(object):
             if not key in opts:
                 opts[key] = defaults[key]
 
+        attrs = Schema.attrset(self.type)
+        schema_defaults = Schema.defaults(self.type)
         for key in list(opts.keys()):
-            if not key in Schema.attrs(self.type):
+            if not key in attrs:
                 del opts[key]
             elif key.endswith('Count') or key in ignore or opts[key] is None:
                 del opts[key]
-            elif opts[key] == Schema.default(self.type, key) and key not in forced:
+            elif opts[key] == schema_defaults.get(key) and key not in forced:
                 del opts[key]
 
         self.setEntries(opts)
@@ -49,24 +56,42 @@ class ConfigSection(object):
     def setEntries(self, d):
         self.entries.update(d)
 
+    def render(self, out):
+        """Append this section in qdrouterd config file format to the list out
+
+        Entries without a value are skipped. Values are written the way
+        json.dumps would write them, less any quotes.
+        """
+        out.append(self.type)
+        first = True
+        for key, val in self.entries.items():
+            if not val:
+                continue
+            out.append(" {\n    " if first else "\n    ")
+            first = False
+            out.append("#" + key if key in self.commented else key)
+            out.append(": ")
+            if isinstance(val, str) and not _needs_escape.search(val):
+                out.append(val)
+            elif isinstance(val, (dict, list)):
+                out.append(json.dumps(val, indent=4, separators=('', ': ')).replace('"', '').replace('\n', '\n    '))
+            else:
+                out.append(json.dumps(val).replace('"', ''))
+        out.append(" {}" if first else "\n}")
+        return out
+
     def __repr__(self):
-        # ensure all entries have values
-        self.entries = {k: v for k, v in self.entries.items() if self.entries.get(k)}
-        raw = self.type + " " + json.dumps(self.entries, indent=4, separators=('', ': '))
-        return re.sub('["]', '', raw)
+        return ''.join(self.render([]))
 
 class RouterSection(ConfigSection):
     defaults = {"mode": "interior"}
     ignore = ["type", "routerId", "identity", "name"]
     forced = ["mode"]
+    commented = ("deploy_host",)
     def __init__(self, id, **kwargs):
         super(RouterSection, self).__init__("router", RouterSection.defaults, RouterSection.ignore, RouterSection.forced, kwargs)
         self.setEntry("id", id)
 
-    def __repr__(self):
-        s = super(RouterSection, self).__repr__()
-        return s.replace('deploy_host', '#deploy_host', 1)
-
 class ListenerSection(ConfigSection):
     defaults = {"role": "normal",
                  "host": "0.0.0.0",
@@ -0,0 +1,503 @@
+#!/usr/bin/env python
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import gzip
+import http.server
+import json
+import os
+import selectors
+import socket
+import socketserver
+import stat
+import threading
+import time
+import traceback
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+from . metrics import metrics
+from . response import PreparedResponse, StaticFiles, etag_matches
+
+# shorten what gets logged about a request or response
+def truncate(data, limit=1000):
+    if isinstance(data, bytes):
+        data = data.decode('utf-8', 'replace')
+    if len(data) > limit:
+        return "%s... (%d more characters)" % (data[:limit], len(data) - limit)
+    return data
+
+class HttpHandler(http.server.SimpleHTTPRequestHandler):
+    # responses bigger than this are streamed, smaller ones are only compressed if over gzip_min_size
+    stream_size = 64 * 1024
+    gzip_min_size = 1024
+
+    # keep connections open between requests. Between requests a connection waits in the
+    # server's selector rather than in a worker, so timeout only applies to reading a request
+    protocol_version = "HTTP/1.1"
+    timeout = 5
+    # headers and body are separate writes, don't let the second one wait on a delayed ack
+    disable_nagle_algorithm = True
+
+    # the server calls handle_one_request each time a request arrives, see ConfigTCPServer
+    def __init__(self, request, client_address, server):
+        self.request = request
+        self.client_address = client_address
+        self.server = server
+        self.directory = os.getcwd()
+        # set once a stream thread has taken over the connection
+        self.detached = False
+        self.setup()
+
+    # whether the next request has already been read from the connection
+    def buffered(self):
+        try:
+            self.connection.settimeout(0)
+            try:
+                return bool(self.rfile.peek(1))
+            finally:
+                self.connection.settimeout(self.timeout)
+        except OSError:
+            return False
+
+    # use GET requests to serve the web pages
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/deploy-stream':
+            return self.stream(self.stream_deploy, parse_qs(url.query))
+        if url.path == '/topology-stream':
+            return self.stream(self.stream_topology, parse_qs(url.query))
+        if url.path == '/schema.json':
+            sent = self.send_prepared(self.server.manager.GET_SCHEMA(None))
+            return metrics.observe_bytes("GET_SCHEMA", 0, sent)
+        if url.path == '/metrics':
+            return self.send_text(metrics.render(), 'text/plain; version=0.0.4')
+        if url.path == '/profile':
+            # the profile of the last request sent with "profile": true
+            return self.send_text(metrics.last_profile() or "no request has been profiled\n", 'text/plain')
+        self.send_static(url.path)
+
+    # the same headers GET would send for a file
+    def do_HEAD(self):
+        self.send_static(urlparse(self.path).path, head=True)
+
+    # the console's own files are revalidated on every page load, which costs a 304 while they
+    # are unchanged. The libraries under node_modules only change when npm install is run
+    def cache_control(self, path):
+        return 'public, max-age=3600' if path.startswith('/node_modules/') else 'no-cache'
+
+    # send a file from the directory the server was started in. Small ones come from memory,
+    # large ones are copied straight from the file to the socket
+    def send_static(self, url_path, head=False):
+        path = self.translate_path(self.path)
+        if path.endswith('/'):
+            path += 'index.html'
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        if st is None or not stat.S_ISREG(st.st_mode):
+            # directories and errors are handled the usual way
+            if head:
+                return http.server.SimpleHTTPRequestHandler.do_HEAD(self)
+            return http.server.SimpleHTTPRequestHandler.do_GET(self)
+
+        cache_control = self.cache_control(url_path)
+        response = self.server.assets.get(path, st, self.guess_type(path))
+        if response is not None:
+            return self.send_prepared(response, cache_control, head)
+
+        etag = '"%x-%x"' % (st.st_mtime_ns, st.st_size)
+        if etag_matches(etag, self.headers.get('If-None-Match')):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', cache_control)
+            self.end_headers()
+            return
+        with open(path, 'rb') as f:
+            self.send_response(200)
+            self.send_header('Content-Type', self.guess_type(path))
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', cache_control)
+            self.send_header('Content-Length', str(st.st_size))
+            self.end_headers()
+            if not head:
+                # sendfile, so the contents never pass through python
+                self.connection.sendfile(f, 0, st.st_size)
+
+    # server-sent events can go on for as long as a deployment or a browser tab, so they are
+    # sent from their own thread and the worker is free for other requests
+    def stream(self, send, *args):
+        if not self.server.start_stream(self, send, *args):
+            self.send_error(503, "Too many open streams")
+
+    # send the deployment output as server-sent events until the deployment is done
+    def stream_deploy(self, query):
+        manager = self.server.manager
+        offset = int(self.headers.get('Last-Event-ID') or query.get('offset', ['0'])[0])
+        self.start_events()
+
+        for next_offset, text in manager.deploy_log.follow(offset):
+            if text is None:
+                # a comment line, so a client that went away is noticed
+                event = ": keepalive\n\n"
+            else:
+                data = ''.join("data: %s\n" % line for line in text.split('\n'))
+                event = "id: %d\n%s\n" % (next_offset, data)
+            self.wfile.write(event.encode('utf-8'))
+            self.wfile.flush()
+        self.wfile.write(("event: state\ndata: %s\n\n" % json.dumps(manager.state)).encode('utf-8'))
+        self.wfile.flush()
+
+    # send the changes made to the files of a watched topology as server-sent events.
+    # without a revision only changes from now on are sent
+    def stream_topology(self, query):
+        topology = query.get('topology', [None])[0]
+        live = self.server.manager.live
+        if live is None or live.name != topology:
+            return self.send_error(404, "Topology is not being watched")
+        revision = self.headers.get('Last-Event-ID') or query.get('revision', [None])[0]
+        revision = live.revision if revision is None else int(revision)
+        self.start_events()
+
+        for change in live.follow(revision):
+            if change is None:
+                event = ": keepalive\n\n"
+            else:
+                event = "id: %d\nevent: change\ndata: %s\n\n" % (change["revision"], json.dumps(change))
+            self.wfile.write(event.encode('utf-8'))
+            self.wfile.flush()
+
+    def start_events(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+    def getheader(self, key, default):
+        headers = self.headers._headers
+        for (name, value) in headers:
+            if name == key:
+                return value
+        return default
+
+    # use POST requests to send commands
+    def do_POST(self):
+        content_len = int(self.headers.get("Content-Length", 0))
+        if content_len > 0:
+            body = self.rfile.read(content_len)
+            # a whole topology can be megabytes
+            self.log_message("%s", truncate(body))
+            data = json.loads(body)
+            try:
+                response = self.server.manager.operation(data['operation'], data)
+                if response is None:
+                    return self.send_error(501, data['operation'] + " is not implemented")
+                if isinstance(response, PreparedResponse):
+                    sent = self.send_prepared(response)
+                else:
+                    sent = self.send_json(response)
+                metrics.observe_bytes(data['operation'].replace("-", "_"), content_len, sent)
+            except Exception:
+                self.send_error(500, traceback.format_exc())
+        else:
+            self.send_error(400, "Missing request body")
+
+    # encode the response a piece at a time. Small responses are sent with a Content-Length,
+    # larger ones are streamed with chunked encoding as they are encoded. Returns the bytes sent
+    def send_json(self, response):
+        gzipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+        chunks = json.JSONEncoder().iterencode(response)
+
+        # encode the first stream_size characters before sending anything so an
+        # error in the common case still gets a 500 response
+        first = []
+        size = 0
+        for chunk in chunks:
+            first.append(chunk)
+            size += len(chunk)
+            if size >= self.stream_size:
+                break
+        else:
+            content = ''.join(first).encode('utf-8')
+            if self.server.verbose:
+                self.log_message("response: %s", truncate(content))
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            if gzipped and len(content) > self.gzip_min_size:
+                content = gzip.compress(content, 6)
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Vary', 'Accept-Encoding')
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+            return len(content)
+
+        if self.server.verbose:
+            self.log_message("response: %s", truncate(''.join(first)))
+        # HTTP/1.0 clients don't understand chunked encoding, so the end of the connection ends the response
+        chunked = self.request_version != 'HTTP/1.0'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Vary', 'Accept-Encoding')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzipped else None
+        sent = [0]
+        def send(data):
+            if data:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data) if chunked else data)
+                sent[0] += len(data)
+        def write(text):
+            data = text.encode('utf-8')
+            send(compressor.compress(data) if compressor else data)
+
+        try:
+            write(''.join(first))
+            buf = []
+            size = 0
+            for chunk in chunks:
+                buf.append(chunk)
+                size += len(chunk)
+                if size >= self.stream_size:
+                    write(''.join(buf))
+                    buf = []
+                    size = 0
+            write(''.join(buf))
+            if compressor:
+                send(compressor.flush())
+            if chunked:
+                self.wfile.write(b"0\r\n\r\n")
+        except Exception:
+            # too late for an error response. Dropping the connection tells the client the response is incomplete
+            self.log_error("error while streaming response: %s", traceback.format_exc())
+            self.close_connection = True
+        return sent[0]
+
+    def send_text(self, text, content_type):
+        body = text.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type + '; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # send a pre-encoded response, or 304 if the client already has it. By default
+    # clients always revalidate, which is free when the ETag still matches
+    # send a response that was encoded ahead of time. Returns the bytes of body sent
+    def send_prepared(self, response, cache_control='no-cache', head=False):
+        if response.matches(self.headers.get('If-None-Match')):
+            self.send_response(304)
+            self.send_header('ETag', response.etag)
+            self.send_header('Cache-Control', cache_control)
+            self.end_headers()
+            return 0
+
+        body = response.body
+        self.send_response(200)
+        self.send_header('Content-Type', response.content_type)
+        self.send_header('ETag', response.etag)
+        self.send_header('Cache-Control', cache_control)
+        self.send_header('Vary', 'Accept-Encoding')
+        if response.gzipped is not None and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = response.gzipped
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if head:
+            return 0
+        self.wfile.write(body)
+        return len(body)
+
+    # only log if verbose was requested
+    def log_request(self, code='-', size='-'):
+        if self.server.verbose:
+            self.log_message('"%s" %s %s', self.requestline, str(code), str(size))
+
+class ConfigTCPServer(socketserver.TCPServer):
+    """Handles requests with a fixed number of worker threads
+
+    A worker handles one request at a time. A keep-alive connection that
+    has no request waiting goes back to a selector watched by one thread,
+    and only gets a worker again once its next request arrives, so idle
+    browser connections don't hold workers. New connections are turned
+    away with a 503 while backlog requests are already waiting for a worker.
+    Event streams are sent from threads of their own, up to max_streams.
+    """
+    allow_reuse_address = True
+    # seconds an idle keep-alive connection is kept open
+    keepalive = 30
+    backlog = 64
+    # event streams open at once, each has its own thread
+    max_streams = 64
+
+    def __init__(self, port, manager, verbose, workers=8, static_cache_size=64 << 20):
+        socketserver.TCPServer.__init__(self, ("", port), HttpHandler)
+        self.manager = manager
+        self.verbose = verbose
+        self.assets = StaticFiles(static_cache_size)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.workers = workers
+        # connections given to the pool that haven't finished their request yet
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.idle = selectors.DefaultSelector()
+        # connections to add to idle, with the time they went idle. The idle thread is woken to add them
+        self.parked = []
+        self.wakeup, self.waker = socket.socketpair()
+        self.idle.register(self.wakeup, selectors.EVENT_READ)
+        self.streams = 0
+        self.closed = False
+        thread = threading.Thread(target=self.watch_idle)
+        thread.daemon = True
+        thread.start()
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            full = self.pending >= self.workers + self.backlog
+            if not full:
+                self.pending += 1
+        if full:
+            try:
+                request.sendall(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        try:
+            handler = self.RequestHandlerClass(request, client_address, self)
+        except Exception:
+            self.end_request()
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            return
+        self.submit(handler)
+
+    def submit(self, handler):
+        try:
+            self.pool.submit(self.serve_connection, handler)
+        except RuntimeError:
+            # the server is shutting down
+            self.end_request()
+            self.close_connection(handler)
+
+    # handle the requests waiting on a connection, then give it back to the selector or close it
+    def serve_connection(self, handler):
+        try:
+            while True:
+                handler.close_connection = True
+                handler.handle_one_request()
+                if handler.detached:
+                    # a stream thread has the connection now
+                    return
+                if handler.close_connection:
+                    break
+                if not handler.buffered():
+                    self.park(handler)
+                    return
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+        finally:
+            self.end_request()
+        self.close_connection(handler)
+
+    # send an event stream from a new thread, which closes the connection when it's done.
+    # Returns False if too many streams are open
+    def start_stream(self, handler, send, *args):
+        with self.lock:
+            if self.streams >= self.max_streams:
+                return False
+            self.streams += 1
+        handler.detached = True
+        thread = threading.Thread(target=self.run_stream, args=(handler, send, args))
+        thread.daemon = True
+        thread.start()
+        return True
+
+    def run_stream(self, handler, send, args):
+        try:
+            send(*args)
+        except ConnectionError:
+            # the client went away
+            pass
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+        finally:
+            with self.lock:
+                self.streams -= 1
+            self.close_connection(handler)
+
+    def end_request(self):
+        with self.lock:
+            self.pending -= 1
+
+    def close_connection(self, handler):
+        try:
+            handler.finish()
+        except Exception:
+            pass
+        self.shutdown_request(handler.request)
+
+    def park(self, handler):
+        with self.lock:
+            self.parked.append((handler, time.monotonic()))
+        self.waker.send(b'\0')
+
+    def watch_idle(self):
+        swept = time.monotonic()
+        while not self.closed:
+            events = self.idle.select(timeout=1)
+            for key, mask in events:
+                if key.fileobj is self.wakeup:
+                    self.wakeup.recv(4096)
+                    continue
+                self.idle.unregister(key.fileobj)
+                # only new connections are turned away, this one has a request waiting
+                with self.lock:
+                    self.pending += 1
+                self.submit(key.data[0])
+            with self.lock:
+                parked, self.parked = self.parked, []
+            for handler, since in parked:
+                self.idle.register(handler.connection, selectors.EVENT_READ, (handler, since))
+            now = time.monotonic()
+            if now - swept >= 1:
+                swept = now
+                for key in list(self.idle.get_map().values()):
+                    if key.data is not None and key.data[1] < now - self.keepalive:
+                        self.idle.unregister(key.fileobj)
+                        self.close_connection(key.data[0])
+        for key in list(self.idle.get_map().values()):
+            if key.data is not None:
+                self.close_connection(key.data[0])
+        self.idle.close()
+
+    def server_close(self):
+        socketserver.TCPServer.server_close(self)
+        self.closed = True
+        self.waker.send(b'\0')
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,150 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from urllib.parse import quote
+from . parser import parse
+
+# the sections last read from each store, by path, with the store's revision
+_memo = {}
+_memo_lock = threading.Lock()
+# the paths of the stores whose tables have been made
+_ready = set()
+
+class TopologyStore(object):
+    """A topology kept in a single SQLite file instead of a .conf file per router
+
+    Each router has a row with its rendered config, the sections parsed from
+    it and the sha1 of the config, indexed by router name. position is the
+    order the routers were published in, and is the index LOAD gives them.
+    The .conf files qdrouterd reads are written by exporting the store.
+    """
+    filename = "topology.db"
+
+    def __init__(self, path):
+        self.path = path + self.filename
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def sections(self):
+        """Return the sections of every router, in position order
+
+        They are only decoded again if the store was written since the last call.
+        """
+        with closing(self._connect()) as db:
+            revision = self._revision(db)
+            with _memo_lock:
+                memo = _memo.get(self.path)
+            if memo is None or memo[0] != revision:
+                memo = (revision, [json.loads(row[0]) for row in db.execute("SELECT sections FROM routers ORDER BY position")])
+                with _memo_lock:
+                    _memo[self.path] = memo
+        # callers are free to modify what they get back
+        return [[[s[0], dict(s[1])] for s in sections] for sections in memo[1]]
+
+    def get(self, name=None, position=None):
+        """Return (position, sections) for the router with the given name or position, or None"""
+        with closing(self._connect()) as db:
+            if name is not None:
+                row = db.execute("SELECT position, sections FROM routers WHERE name = ?", (name,)).fetchone()
+            else:
+                row = db.execute("SELECT position, sections FROM routers WHERE position = ?", (position,)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def config(self, name):
+        """Return the config file text of a router, or None"""
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT config FROM routers WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def configs(self):
+        """Return the config file text of every router by name, in position order"""
+        with closing(self._connect()) as db:
+            return dict(db.execute("SELECT name, config FROM routers ORDER BY position"))
+
+    def write(self, configs):
+        """Make the store hold exactly configs, a dict of config file text by router name
+
+        The routers' positions follow the order of configs. Returns the names
+        that were added, changed, removed and unchanged, like PUBLISH does.
+        """
+        summary = {"added": [], "changed": [], "removed": [], "unchanged": []}
+        moved = False
+        with closing(self._connect(create=True)) as db:
+            with db:
+                known = dict((row[0], (row[1], row[2])) for row in db.execute("SELECT name, position, digest FROM routers"))
+                # positions are unique, so move everything out of the way first
+                db.execute("UPDATE routers SET position = -1 - position")
+                for position, (name, config) in enumerate(configs.items()):
+                    digest = hashlib.sha1(config.encode('utf-8')).hexdigest()
+                    old = known.pop(name, None)
+                    if old is None:
+                        db.execute("INSERT INTO routers (name, position, digest, sections, config) VALUES (?, ?, ?, ?, ?)",
+                                   (name, position, digest, _sections(config), config))
+                        summary["added"].append(name)
+                    elif old[1] != digest:
+                        db.execute("UPDATE routers SET position = ?, digest = ?, sections = ?, config = ? WHERE name = ?",
+                                   (position, digest, _sections(config), config, name))
+                        summary["changed"].append(name)
+                    else:
+                        db.execute("UPDATE routers SET position = ? WHERE name = ?", (position, name))
+                        summary["unchanged"].append(name)
+                        moved = moved or old[0] != position
+                for name in known:
+                    db.execute("DELETE FROM routers WHERE name = ?", (name,))
+                    summary["removed"].append(name)
+                if moved or summary["added"] or summary["changed"] or summary["removed"]:
+                    db.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+        return summary
+
+    # reads open the file as it is and fail rather than make an empty one. Writes make
+    # the tables the first time they see the file
+    def _connect(self, create=False):
+        if not create:
+            return sqlite3.connect("file:%s?mode=rw" % quote(self.path), uri=True)
+        db = sqlite3.connect(self.path)
+        # a file sqlite has just made is empty, even at a path seen before
+        with _memo_lock:
+            if self.path in _ready and os.path.getsize(self.path) > 0:
+                return db
+        with db:
+            db.execute("CREATE TABLE IF NOT EXISTS routers (name TEXT PRIMARY KEY, position INTEGER NOT NULL UNIQUE, "
+                       "digest TEXT NOT NULL, sections TEXT NOT NULL, config TEXT NOT NULL)")
+            # revision counts the writes that changed something. created tells
+            # a store apart from an earlier one at the same path
+            db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0)")
+            db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('created', ?)", (time.time_ns(),))
+        with _memo_lock:
+            _ready.add(self.path)
+        return db
+
+    def _revision(self, db):
+        return tuple(row[0] for row in db.execute("SELECT value FROM meta WHERE key IN ('created', 'revision') ORDER BY key"))
+
+def _sections(config):
+    # stored the way the parser returns them so LOAD sees the same thing it would from the file
+    return json.dumps(parse(config.splitlines()), separators=(',', ':'))
@@ -0,0 +1,260 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+from array import array
+
+# node fields that hold sections
+sectionFields = ("logs", "sslProfiles", "connectors", "listeners", "addresss")
+localHosts = ('0.0.0.0', 'localhost', '127.0.0.1')
+
+def resolve(host, router_host, port):
+    """Return the (host, port) a listener or connector of a router deployed on router_host refers to"""
+    # a wildcard or loopback address refers to the host the router is deployed on
+    if not host or host in localHosts:
+        host = router_host
+    if host in localHosts:
+        host = None
+    return (host, port)
+
+class Node(object):
+    """A router in a topology
+
+    router holds the router attributes. sections maps each node field in
+    sectionFields (listeners, addresss, ...) that has any sections to a dict
+    of the sections' attributes by key. The attribute dicts are shared with
+    whatever the node was made from and are not changed.
+    """
+    __slots__ = ('index', 'name', 'nodeType', 'host', 'cls', 'router', 'sections')
+
+    def __init__(self, index, name, nodeType, host=None, cls='router', router=None, sections=None):
+        self.index = index
+        self.name = name
+        self.nodeType = nodeType
+        self.host = host
+        self.cls = cls
+        self.router = router
+        self.sections = sections if sections is not None else {}
+
+    @staticmethod
+    def from_dict(d, details=True):
+        """Make a Node from a node sent by the console
+
+        Without details only what is needed to connect the node is kept.
+        """
+        node = Node(d.get('index', -1), d.get('name'), d.get('nodeType'), d.get('host'), d.get('cls'))
+        if details:
+            node.router = dict((k, v) for k, v in d.items() if not isinstance(v, (dict, list)))
+            for field in sectionFields:
+                if d.get(field):
+                    node.sections[field] = d[field]
+        return node
+
+    def add_section(self, field, key, entries):
+        if field not in self.sections:
+            self.sections[field] = {}
+        self.sections[field][key] = entries
+
+    def as_dict(self):
+        """Return the node in the form LOAD sends it to the console"""
+        d = {"index": self.index, "nodeType": self.nodeType, "name": self.name,
+             "key": "amqp:/_topo/0/" + self.name + "/$management"}
+        if self.host:
+            d['host'] = self.host
+        d.update(self.sections)
+        return d
+
+class Topology(object):
+    """Nodes and the links between them
+
+    Links are kept as two arrays of node positions. The links out of and
+    into each node are indexed in compressed sparse row form, built the first
+    time they are asked for.
+    """
+    __slots__ = ('nodes', 'sources', 'targets', '_outgoing', '_incoming')
+
+    def __init__(self, nodes, sources=(), targets=()):
+        self.nodes = nodes
+        self.sources = array('i', sources)
+        self.targets = array('i', targets)
+        self._outgoing = None
+        self._incoming = None
+
+    @staticmethod
+    def from_request(nodes, links, details=True):
+        return Topology([Node.from_dict(n, details) for n in nodes],
+                        [l['source'] for l in links], [l['target'] for l in links])
+
+    def outgoing(self, i):
+        """Return the numbers of the links whose source is node i, in link order"""
+        if self._outgoing is None:
+            self._outgoing = _csr(self.sources, len(self.nodes))
+        offsets, links = self._outgoing
+        return links[offsets[i]:offsets[i + 1]]
+
+    def incoming(self, i):
+        """Return the numbers of the links whose target is node i, in link order"""
+        if self._incoming is None:
+            self._incoming = _csr(self.targets, len(self.nodes))
+        offsets, links = self._incoming
+        return links[offsets[i]:offsets[i + 1]]
+
+    def links(self, numbers=None):
+        """Return links in the form LOAD sends them to the console"""
+        if numbers is None:
+            numbers = range(len(self.sources))
+        return [{'source': self.sources[l], 'target': self.targets[l], 'dir': "in"} for l in numbers]
+
+class Plan(object):
+    """The inter-router and edge listeners and connectors a node needs for its links
+
+    The connector lists hold (port, host, name of the router connected to).
+    """
+    __slots__ = ('ilistener', 'elistener', 'ilisten_from', 'elisten_from', 'iconns', 'econns')
+
+    def __init__(self):
+        self.ilistener = None
+        self.elistener = None
+        self.ilisten_from = []
+        self.elisten_from = []
+        self.iconns = []
+        self.econns = []
+
+    def linked(self):
+        return bool(self.iconns or self.econns or self.ilistener is not None or self.elistener is not None)
+
+class Ports(object):
+    """The ports in use on each host of a topology
+
+    Hosts are keyed the way resolve() gives them, so the local host is None.
+    Ports in everywhere, like the console's http port, are never free. Each
+    port used twice on a host, and anything else that would stop the routers
+    from starting, is described in conflicts.
+    """
+    __slots__ = ('hosts', 'everywhere', 'conflicts')
+
+    def __init__(self, everywhere=()):
+        self.hosts = {}
+        self.everywhere = set(everywhere)
+        self.conflicts = []
+
+    @staticmethod
+    def from_request(nodes, everywhere=()):
+        """Return the Ports used by the listeners of the routers sent by the console"""
+        ports = Ports(everywhere)
+        for n in nodes:
+            if n.get('cls') == 'router' and n.get('listeners'):
+                host = resolve(None, n.get('host'), None)[0]
+                for entries in n['listeners'].values():
+                    port = entries.get('port', 'amqp')
+                    try:
+                        port = 5672 if port == 'amqp' else int(port)
+                    except ValueError:
+                        continue
+                    ports.claim(host, port, n.get('name'))
+        return ports
+
+    def free(self, host, port):
+        return port not in self.everywhere and port not in self.hosts.get(host, ())
+
+    def claim(self, host, port, owner):
+        used = self.hosts.setdefault(host, {})
+        if port in used:
+            self.conflicts.append("port %d on %s is used by both %s and %s" %
+                                  (port, host or "the local host", used[port], owner))
+        else:
+            used[port] = owner
+
+def connect(topology, default_host, listen_port, ports=None, previous=None):
+    """Return a Plan for each node
+
+    A node that is the source of a link gets a listener for its inter-router
+    links and one for its edge links. A listener keeps the port it has in
+    previous, a dict of ports by (node name, role), if that is still free on
+    the node's host in ports. The others are given the next port from
+    listen_port that no other listener has and is free on their host, in the
+    order the links need them. The listeners are added to ports.
+    """
+    nodes = topology.nodes
+    plans = [Plan() for n in nodes]
+    if ports is None:
+        ports = Ports()
+
+    # the listeners needed, as (node position, edge), in the order the links first need them
+    wanted = []
+    seen = set()
+    for s_i, t_i in zip(topology.sources, topology.targets):
+        listener = (s_i, nodes[s_i].nodeType == 'edge' or nodes[t_i].nodeType == 'edge')
+        if listener not in seen:
+            seen.add(listener)
+            wanted.append(listener)
+
+    # every listener port is unique so the configs can also be run side by side on one host
+    taken = set()
+    assigned = {}
+    full = False
+    for listener in wanted if previous else ():
+        node = nodes[listener[0]]
+        port = previous.get((node.name, 'edge' if listener[1] else 'inter-router'))
+        host = resolve(None, node.host, None)[0]
+        if port is not None and listen_port <= port <= 65535 and port not in taken and ports.free(host, port):
+            taken.add(port)
+            ports.claim(host, port, node.name)
+            assigned[listener] = port
+    for listener in wanted:
+        if listener not in assigned:
+            node = nodes[listener[0]]
+            host = resolve(None, node.host, None)[0]
+            while listen_port in taken or not ports.free(host, listen_port):
+                listen_port += 1
+            if listen_port > 65535 and not full:
+                ports.conflicts.append("there are no free ports left for the listeners of %s and later routers" % node.name)
+                full = True
+            taken.add(listen_port)
+            ports.claim(host, listen_port, node.name)
+            assigned[listener] = listen_port
+
+    for s_i, t_i in zip(topology.sources, topology.targets):
+        s = nodes[s_i]
+        t = nodes[t_i]
+        sp = plans[s_i]
+        tp = plans[t_i]
+        lhost = default_host if s.host is None else s.host
+        if s.nodeType == 'edge' or t.nodeType == 'edge':
+            sp.elisten_from.append(t.name)
+            sp.elistener = assigned[(s_i, True)]
+            tp.econns.append((sp.elistener, lhost, s.name))
+        else:
+            sp.ilisten_from.append(t.name)
+            sp.ilistener = assigned[(s_i, False)]
+            tp.iconns.append((sp.ilistener, lhost, s.name))
+    return plans
+
+def _csr(keys, n):
+    # a stable counting sort of the link numbers by key
+    offsets = array('i', [0]) * (n + 1)
+    for k in keys:
+        offsets[k + 1] += 1
+    for i in range(n):
+        offsets[i + 1] += offsets[i]
+    fill = array('i', offsets[:n])
+    links = array('i', [0]) * len(keys)
+    for link, k in enumerate(keys):
+        links[fill[k]] = link
+        fill[k] += 1
+    return offsets, links
@@ -0,0 +1,144 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+
+# from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+_event = struct.Struct('iIII')
+
+def _inotify():
+    """Return libc if it has inotify, otherwise None"""
+    name = ctypes.util.find_library('c')
+    if not name:
+        return None
+    try:
+        libc = ctypes.CDLL(name, use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+class Watcher(object):
+    """Calls callback with the names of the files in a directory that were written, moved or removed
+
+    Uses inotify where there is one and otherwise compares the mtime and size
+    of every file each interval seconds. Changes that arrive within settle
+    seconds of each other are passed to callback together. callback is given
+    None if some changes may have been missed and the whole directory should
+    be looked at again.
+    """
+    settle = 0.05
+
+    def __init__(self, path, callback, suffix='.conf', interval=1.0, polling=False):
+        self.path = path
+        self.callback = callback
+        self.suffix = suffix
+        self.interval = interval
+        self.libc = None if polling else _inotify()
+        self.method = "inotify" if self.libc else "poll"
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        target = self._inotify if self.libc else self._poll
+        self.thread = threading.Thread(target=target, name="watch " + self.path)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def _notify(self, names):
+        try:
+            self.callback(names)
+        except Exception as e:
+            print ("error handling changes to %s: %s" % (self.path, e))
+
+    def _inotify(self):
+        fd = self.libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if fd < 0:
+            return self._poll()
+        mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+        if self.libc.inotify_add_watch(fd, self.path.encode(), mask) < 0:
+            os.close(fd)
+            return self._poll()
+        try:
+            while not self.stopped.is_set():
+                if not select.select([fd], [], [], 0.5)[0]:
+                    continue
+                names = set()
+                rescan = False
+                # keep reading until things go quiet so a burst of writes is handled once
+                while select.select([fd], [], [], self.settle)[0]:
+                    buf = os.read(fd, 65536)
+                    offset = 0
+                    while offset < len(buf):
+                        wd, event, cookie, length = _event.unpack_from(buf, offset)
+                        name = buf[offset + _event.size:offset + _event.size + length].rstrip(b'\0').decode()
+                        offset += _event.size + length
+                        if event & (IN_DELETE_SELF | IN_MOVE_SELF):
+                            self.stopped.set()
+                        elif event & IN_Q_OVERFLOW:
+                            rescan = True
+                        elif name.endswith(self.suffix):
+                            names.add(name)
+                if rescan:
+                    self._notify(None)
+                elif names:
+                    self._notify(names)
+        finally:
+            os.close(fd)
+
+    def _poll(self):
+        stamps = self._stamps()
+        while not self.stopped.wait(self.interval):
+            current = self._stamps()
+            names = set(n for n in current if stamps.get(n) != current[n])
+            names.update(n for n in stamps if n not in current)
+            stamps = current
+            if names:
+                self._notify(names)
+
+    def _stamps(self):
+        stamps = {}
+        try:
+            for entry in os.scandir(self.path):
+                if entry.name.endswith(self.suffix):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    stamps[entry.name] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            pass
+        return stamps